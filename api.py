@@ -0,0 +1,238 @@
+"""Headless HTTP inference API on the same question path as the Streamlit app.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+POST /v1/generate          {"question": "...", "history": [...]} -> {"answer": "..."}
+POST /v1/generate/stream   same body, answer streamed as server-sent events
+POST /v1/batch             {"questions": ["...", ...]} -> {"results": [...]}
+GET  /healthz, GET /metrics
+
+Callers are queued fairly per X-Session-Id header (or client address);
+batch questions run at a lower priority than single generations.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from inference import ask_llama3, ask_llama3_stream
+from metrics import render_prometheus
+from ratelimit import CircuitOpenError
+from scheduler import BATCH, QueueFullError
+
+MAX_CONCURRENCY = int(os.environ.get("API_MAX_CONCURRENCY", "32"))
+MAX_QUEUE = int(os.environ.get("API_MAX_QUEUE", "64"))
+MAX_BATCH = int(os.environ.get("API_MAX_BATCH", "64"))
+BATCH_CONCURRENCY = int(os.environ.get("API_BATCH_CONCURRENCY", "8"))
+
+_DONE = object()
+
+
+class Saturated(Exception):
+    """Raised when both the worker slots and the wait queue are full"""
+
+
+class Admission:
+    """At most max_concurrency requests run; up to max_queue more wait; the rest are refused"""
+
+    def __init__(self, max_concurrency, max_queue):
+        self.limit = max_concurrency + max_queue
+        self.admitted = 0
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        if self.admitted >= self.limit:
+            raise Saturated()
+        self.admitted += 1
+        try:
+            await self.semaphore.acquire()
+        except BaseException:
+            self.admitted -= 1
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+        self.admitted -= 1
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        self.status = status
+        self.message = message
+        self.headers = list(headers)
+
+
+async def read_json(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(b"".join(chunks) or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPError(400, "Request body must be JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+def parse_question(payload):
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPError(400, "'question' must be a non-empty string")
+    history = payload.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(message, dict)
+        and isinstance(message.get("role"), str)
+        and isinstance(message.get("content"), str)
+        for message in history
+    ):
+        raise HTTPError(400, "'history' must be a list of {role, content} messages")
+    return question, history
+
+
+def session_of(scope):
+    """Fair-queuing key for a request: its X-Session-Id header, else the client address"""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-session-id" and value:
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())] + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def error_status(exc):
+    if isinstance(exc, HTTPError):
+        return exc.status, exc.message, exc.headers
+    if isinstance(exc, Saturated):
+        return 429, "Server is saturated, retry later", [(b"retry-after", b"1")]
+    if isinstance(exc, QueueFullError):
+        return 429, str(exc), [(b"retry-after", b"1")]
+    if isinstance(exc, CircuitOpenError):
+        return 503, str(exc), [(b"retry-after", b"30")]
+    return 502, f"Error generating response: {exc}", []
+
+
+class InferenceAPI:
+    """Minimal ASGI application; blocking inference runs on bounded thread pools.
+
+    Batch questions get their own smaller pool, so however many batches are
+    queued they can never take the threads single generations run on.
+    """
+
+    def __init__(self):
+        self.admission = None
+        self.executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+        self.batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+    async def run(self, fn, *args, executor=None):
+        executor = executor or self.executor
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.admission is None:
+            self.admission = Admission(MAX_CONCURRENCY, MAX_QUEUE)
+        route = (scope["method"], scope["path"])
+        try:
+            if route == ("GET", "/healthz"):
+                await send_json(send, 200, {"status": "ok", "in_flight": self.admission.admitted})
+            elif route == ("GET", "/metrics"):
+                await self.metrics(send)
+            elif route == ("POST", "/v1/generate"):
+                await self.generate(scope, receive, send)
+            elif route == ("POST", "/v1/generate/stream"):
+                await self.generate_stream(scope, receive, send)
+            elif route == ("POST", "/v1/batch"):
+                await self.batch(scope, receive, send)
+            else:
+                raise HTTPError(404, "Not found")
+        except Exception as e:
+            status, message, headers = error_status(e)
+            await send_json(send, status, {"error": message}, headers)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.batch_executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def metrics(self, send):
+        body = render_prometheus().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; version=0.0.4")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def generate(self, scope, receive, send):
+        question, history = parse_question(await read_json(receive))
+        async with self.admission:
+            answer = await self.run(partial(ask_llama3, question, history, session=session_of(scope)))
+        await send_json(send, 200, {"answer": answer})
+
+    async def generate_stream(self, scope, receive, send):
+        question, history = parse_question(await read_json(receive))
+        async with self.admission:
+            chunks = ask_llama3_stream(question, history, session=session_of(scope))
+            # Pull the first chunk before committing to a 200 so errors map to a status
+            first = await self.run(next, chunks, _DONE)
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")],
+            })
+            chunk = first
+            try:
+                while chunk is not _DONE:
+                    event = f"data: {json.dumps({'text': chunk})}\n\n"
+                    await send({"type": "http.response.body", "body": event.encode("utf-8"),
+                                "more_body": True})
+                    chunk = await self.run(next, chunks, _DONE)
+                tail = "event: done\ndata: {}\n\n"
+            except Exception as e:
+                tail = f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            finally:
+                chunks.close()
+            await send({"type": "http.response.body", "body": tail.encode("utf-8")})
+
+    async def batch(self, scope, receive, send):
+        questions = (await read_json(receive)).get("questions")
+        if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+            raise HTTPError(400, "'questions' must be a list of non-empty strings")
+        if len(questions) > MAX_BATCH:
+            raise HTTPError(413, f"At most {MAX_BATCH} questions per batch")
+        ask = partial(ask_llama3, session=session_of(scope), priority=BATCH)
+
+        async def answer(question):
+            try:
+                return {"answer": await self.run(ask, question, executor=self.batch_executor)}
+            except Exception as e:
+                return {"error": error_status(e)[1]}
+
+        async with self.admission:
+            results = await asyncio.gather(*(answer(q) for q in questions))
+        await send_json(send, 200, {"results": results})
+
+
+app = InferenceAPI()
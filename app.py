@@ -1,46 +1,35 @@
-import boto3
-from langchain_aws import BedrockLLM
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+import os
+import logging
+import threading
+import time
 import streamlit as st
 from datetime import datetime
+from memory import SESSIONS, Message, compact_messages, spill_messages
+from metrics import METRICS, json_log_sink, start_prometheus_server
+from prefetch import PREFETCHER
+from redact import redact
+from scheduler import QueueFullError
+from store import EXPORT_FORMATS, ConversationStore, search_terms, snippet
+import ui
 
-# Initialize boto3 client for AWS Bedrock
-bedrock_client = boto3.client("bedrock-runtime")
+# Number of most recent messages rendered; older ones load on demand
+HISTORY_PAGE_SIZE = 20
 
-# Construct the LLM model
-llm = BedrockLLM(
-    client=bedrock_client,
-    model_id="meta.llama3-70b-instruct-v1:0",
-)
+MESSAGE_SEPARATOR = ui.MESSAGE_SEPARATOR
 
-# Define the prompt with LangChain PromptTemplate
-prompt_template = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
-You are a very intelligent bot with exceptional critical thinking.
-<|start_header_id|>user<|end_header_id|>
-{question}
-<|start_header_id|>assistant<|end_header_id|>
-"""
+@st.cache_resource
+def get_conversation_store() -> ConversationStore:
+    """Persistent conversation log shared by every session in the process"""
+    return ConversationStore(os.environ.get("CONVERSATION_DB", "conversations.sqlite3"))
 
-PROMPT = PromptTemplate(template=prompt_template, input_variables=["question"])
-
-# Use LLMChain for prompting the LLM
-chain = LLMChain(llm=llm, prompt=PROMPT)
-
-def ask_llama3(question: str) -> str:
-    # Run with model kwargs as content in `model_kwargs` dict with `body` string
-    response = chain.invoke(
-        question,
-        model_kwargs={
-            "body": {
-                "max_gen_len": 512,
-                "temperature": 0.5,
-                "top_p": 0.9,
-                # you can add more params here as needed
-            }
-        },
-    )
-    return response
+@st.cache_resource
+def setup_metrics():
+    """Attach the configured metrics sinks once per process"""
+    if os.environ.get("METRICS_JSON_LOG"):
+        logging.basicConfig(level=logging.INFO)
+        METRICS.add_sink(json_log_sink)
+    port = os.environ.get("METRICS_PORT")
+    return start_prometheus_server(int(port)) if port else None
 
 def initialize_session_state():
     """Initialize session state variables for conversation history"""
@@ -48,320 +37,240 @@ def initialize_session_state():
         st.session_state.messages = []
     if "conversation_count" not in st.session_state:
         st.session_state.conversation_count = 0
+    if "message_html" not in st.session_state:
+        st.session_state.message_html = []
+    if "history_window" not in st.session_state:
+        st.session_state.history_window = HISTORY_PAGE_SIZE
+    if "spilled" not in st.session_state:
+        # Oldest messages dropped from memory; they are paged back in from the store
+        st.session_state.spilled = 0
+    if "conversation_id" not in st.session_state:
+        st.session_state.conversation_id = ConversationStore.new_conversation_id()
+    if "session_id" not in st.session_state:
+        # Fair-queuing key; unlike conversation_id it survives "New Conversation"
+        st.session_state.session_id = ConversationStore.new_conversation_id()
+    if "browser_id" not in st.session_state:
+        st.session_state.browser_id = None
+
+def current_owner() -> str:
+    """Key stored conversations are scoped to: this browser, or this session if it cannot report"""
+    return st.session_state.browser_id or st.session_state.session_id
 
 def add_message(role: str, content: str):
     """Add a message to the conversation history"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.messages.append({
-        "role": role,
-        "content": content,
-        "timestamp": timestamp
-    })
+    ts = time.time()
+    st.session_state.messages.append(Message(role, content, ts))
+    get_conversation_store().append(st.session_state.conversation_id, role, content, ts, owner=current_owner())
+    # Keep the in-memory history bounded; the store has every message
+    spilled = spill_messages(st.session_state.messages)
+    if spilled:
+        st.session_state.spilled += spilled
+        del st.session_state.message_html[:spilled]
+    compact_messages(st.session_state.messages)
+
+def total_message_count() -> int:
+    """Number of messages in the session, including those spilled from memory"""
+    return st.session_state.spilled + len(st.session_state.messages)
 
 def add_custom_animations():
-    """Add custom CSS animations to the Streamlit app"""
-    st.markdown("""
-    <style>
-    /* Global App Styling */
-    .stApp {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        background-attachment: fixed;
-    }
-    
-    /* Animated Title */
-    @keyframes titleGlow {
-        0% { text-shadow: 0 0 5px #fff, 0 0 10px #fff, 0 0 15px #0073e6, 0 0 20px #0073e6; }
-        50% { text-shadow: 0 0 10px #fff, 0 0 20px #fff, 0 0 30px #0073e6, 0 0 40px #0073e6; }
-        100% { text-shadow: 0 0 5px #fff, 0 0 10px #fff, 0 0 15px #0073e6, 0 0 20px #0073e6; }
-    }
-    
-    .animated-title {
-        animation: titleGlow 2s ease-in-out infinite alternate;
-        color: white !important;
-        text-align: center;
-        font-size: 2.5rem !important;
-        font-weight: bold;
-        margin-bottom: 2rem;
-    }
-    
-    /* Floating Animation */
-    @keyframes float {
-        0% { transform: translateY(0px); }
-        50% { transform: translateY(-10px); }
-        100% { transform: translateY(0px); }
-    }
-    
-    .floating {
-        animation: float 3s ease-in-out infinite;
-    }
-    
-    /* Pulse Animation */
-    @keyframes pulse {
-        0% { transform: scale(1); }
-        50% { transform: scale(1.05); }
-        100% { transform: scale(1); }
-    }
-    
-    .pulse {
-        animation: pulse 2s ease-in-out infinite;
-    }
-    
-    /* Gradient Button Animation */
-    @keyframes gradientShift {
-        0% { background-position: 0% 50%; }
-        50% { background-position: 100% 50%; }
-        100% { background-position: 0% 50%; }
-    }
-    
-    .stButton > button {
-        background: linear-gradient(45deg, #ff6b6b, #4ecdc4, #45b7d1, #96ceb4);
-        background-size: 300% 300%;
-        animation: gradientShift 3s ease infinite;
-        border: none !important;
-        border-radius: 25px !important;
-        color: white !important;
-        font-weight: bold !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 4px 15px 0 rgba(0,0,0,0.2);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px) scale(1.05);
-        box-shadow: 0 8px 25px 0 rgba(0,0,0,0.3);
-    }
-    
-    /* Animated Cards */
-    @keyframes slideInLeft {
-        from { transform: translateX(-100%); opacity: 0; }
-        to { transform: translateX(0); opacity: 1; }
-    }
-    
-    @keyframes slideInRight {
-        from { transform: translateX(100%); opacity: 0; }
-        to { transform: translateX(0); opacity: 1; }
-    }
-    
-    .slide-in-left {
-        animation: slideInLeft 0.6s ease-out;
-    }
-    
-    .slide-in-right {
-        animation: slideInRight 0.6s ease-out;
-    }
-    
-    /* Chat Message Animations */
-    @keyframes messageAppear {
-        from { opacity: 0; transform: translateY(20px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    
-    .message-appear {
-        animation: messageAppear 0.5s ease-out;
-    }
-    
-    /* Sidebar Styling */
-    .css-1d391kg {
-        background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
-        backdrop-filter: blur(10px);
-        border-radius: 15px;
-        border: 1px solid rgba(255,255,255,0.2);
-    }
-    
-    /* Stats Cards */
-    .stats-card {
-        background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.1));
-        backdrop-filter: blur(10px);
-        border-radius: 15px;
-        padding: 20px;
-        margin: 10px 0;
-        border: 1px solid rgba(255,255,255,0.3);
-        transition: all 0.3s ease;
-    }
-    
-    .stats-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 10px 25px rgba(0,0,0,0.2);
-    }
-    
-    /* Text Area Styling */
-    .stTextArea > div > div > textarea {
-        background: rgba(255,255,255,0.1) !important;
-        border: 2px solid rgba(255,255,255,0.3) !important;
-        border-radius: 15px !important;
-        color: white !important;
-        backdrop-filter: blur(10px);
-    }
-    
-    .stTextArea > div > div > textarea:focus {
-        border-color: #4ecdc4 !important;
-        box-shadow: 0 0 0 2px rgba(78, 205, 196, 0.3) !important;
-    }
-    
-    /* Loading Animation */
-    @keyframes spin {
-        0% { transform: rotate(0deg); }
-        100% { transform: rotate(360deg); }
-    }
-    
-    .loading-spinner {
-        display: inline-block;
-        width: 20px;
-        height: 20px;
-        border: 3px solid rgba(255,255,255,.3);
-        border-radius: 50%;
-        border-top-color: #fff;
-        animation: spin 1s ease-in-out infinite;
-    }
-    
-    /* Success/Error Message Styling */
-    .stSuccess, .stError, .stWarning, .stInfo {
-        border-radius: 15px !important;
-        backdrop-filter: blur(10px);
-    }
-    
-    /* Metric Styling */
-    .metric-container {
-        background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.05));
-        backdrop-filter: blur(10px);
-        border-radius: 15px;
-        padding: 15px;
-        margin: 10px 0;
-        border: 1px solid rgba(255,255,255,0.2);
-        text-align: center;
-        transition: all 0.3s ease;
-    }
-    
-    .metric-container:hover {
-        transform: scale(1.05);
-    }
-    
-    /* Header Animation */
-    @keyframes headerSlide {
-        from { transform: translateY(-50px); opacity: 0; }
-        to { transform: translateY(0); opacity: 1; }
-    }
-    
-    .header-slide {
-        animation: headerSlide 0.8s ease-out;
-    }
-    
-    /* Chat Container Styling */
-    .chat-container {
-        background: rgba(255,255,255,0.1);
-        backdrop-filter: blur(10px);
-        border-radius: 20px;
-        padding: 20px;
-        margin: 20px 0;
-        border: 1px solid rgba(255,255,255,0.2);
-    }
-    
-    /* Welcome Message Animation */
-    @keyframes bounce {
-        0%, 20%, 50%, 80%, 100% { transform: translateY(0); }
-        40% { transform: translateY(-10px); }
-        60% { transform: translateY(-5px); }
-    }
-    
-    .welcome-bounce {
-        animation: bounce 2s ease-in-out infinite;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    """Add custom CSS animations to the Streamlit app and return the browser's id"""
+    # Linked once per browser session instead of resent on every rerun
+    return ui.inject_theme()
 
 def display_animated_header():
     """Display animated header with floating elements"""
-    st.markdown("""
-    <div class="header-slide">
-        <h1 class="animated-title">🚀 Ask Anything: Chat with Llama 3 (AWS Bedrock) 🌟</h1>
-        <div style="text-align: center; margin-bottom: 2rem;">
-            <div class="floating" style="display: inline-block;">
-                <span style="font-size: 2rem;">🤖</span>
-            </div>
-            <div class="pulse" style="display: inline-block; margin: 0 20px;">
-                <span style="font-size: 2rem;">⚡</span>
-            </div>
-            <div class="floating" style="display: inline-block;">
-                <span style="font-size: 2rem;">🧠</span>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    ui.render(ui.HEADER())
 
-def display_animated_metrics(messages_count, conversation_count):
-    """Display animated metric cards"""
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown(f"""
-        <div class="metric-container slide-in-left">
-            <h3 style="color: white; margin: 0;">💬 Messages</h3>
-            <h2 style="color: #4ecdc4; margin: 10px 0 0 0;">{messages_count}</h2>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div class="metric-container slide-in-right">
-            <h3 style="color: white; margin: 0;">🔄 Conversations</h3>
-            <h2 style="color: #ff6b6b; margin: 10px 0 0 0;">{conversation_count}</h2>
-        </div>
-        """, unsafe_allow_html=True)
+def metrics_html(messages_count, conversation_count) -> str:
+    """Animated metric cards"""
+    return ui.METRICS(messages=messages_count, conversations=conversation_count)
+
+def format_seconds(value) -> str:
+    return "–" if value is None else f"{value:.2f}s"
+
+def live_stats_html() -> str:
+    """Live Bedrock latency and token stats for this process"""
+    snapshot = METRICS.snapshot()
+    counters = snapshot["counters"]
+    histograms = snapshot["histograms"]
+    latency = histograms.get("ResponseStream_latency_seconds") or histograms.get("InvokeModel_latency_seconds", {})
+    ttft = histograms.get("time_to_first_token_seconds", {})
+    throughput = histograms.get("output_tokens_per_second", {})
+    tokens_per_second = throughput.get("p50")
+    cache_hits = sum(counters.get(f"response_cache_{kind}_hits_total", 0) for kind in ("exact", "disk", "similar"))
+    return ui.stats_card(
+        "📈 Live Bedrock Stats",
+        f"Latency p50/p95/p99: {format_seconds(latency.get('p50'))} / {format_seconds(latency.get('p95'))} / {format_seconds(latency.get('p99'))}",
+        f"Time to first token p50: {format_seconds(ttft.get('p50'))}",
+        f"Tokens in/out: {counters.get('input_tokens_total', 0)} / {counters.get('output_tokens_total', 0)}",
+        f"Output tokens/s p50: {'–' if tokens_per_second is None else f'{tokens_per_second:.1f}'}",
+        f"Throttles / retries: {counters.get('throttles_total', 0)} / {counters.get('retries_total', 0)}",
+        f"Cache hits / misses: {cache_hits} / {counters.get('response_cache_misses_total', 0)}",
+    )
+
+def render_message_html(message, seq: int) -> str:
+    """Build the HTML fragment for a single chat message"""
+    return ui.message_html(message, seq)
+
+def get_message_html(index: int) -> str:
+    """Return the cached HTML fragment for a message, rendering it only once"""
+    fragments = st.session_state.message_html
+    messages = st.session_state.messages
+    while len(fragments) <= index:
+        fragments.append(None)
+    if fragments[index] is None:
+        # Numbered like the store, so search results can link to the message
+        fragments[index] = render_message_html(messages[index], st.session_state.spilled + index)
+    return fragments[index]
 
 def display_chat_history():
-    """Display the conversation history with animations"""
-    if st.session_state.messages:
-        st.markdown("""
-        <div class="chat-container">
-            <h2 style="color: white; text-align: center; margin-bottom: 20px;">💬 Conversation History</h2>
-        </div>
-        """, unsafe_allow_html=True)
+    """Display the latest window of the conversation history"""
+    messages = st.session_state.messages
+    if messages:
+        spilled = st.session_state.spilled
+        # Sequence number of the oldest visible message
+        start = max(0, spilled + len(messages) - st.session_state.history_window)
+        if start > 0:
+            if st.button(f"⬆️ Load older messages ({start} hidden)", use_container_width=True):
+                st.session_state.history_window += HISTORY_PAGE_SIZE
+                st.rerun()
+        # Drop the HTML of messages that scrolled out of the window; it is cheap to rebuild
+        first = max(0, start - spilled)
+        fragments = st.session_state.message_html
+        fragments[:first] = [None] * min(first, len(fragments))
         
-        for i, message in enumerate(st.session_state.messages):
-            if message["role"] == "user":
-                st.markdown(f"""
-                <div class="message-appear" style="background: linear-gradient(135deg, rgba(78, 205, 196, 0.2), rgba(78, 205, 196, 0.1)); 
-                     backdrop-filter: blur(10px); border-radius: 15px; padding: 15px; margin: 10px 0; 
-                     border-left: 4px solid #4ecdc4;">
-                    <h4 style="color: #4ecdc4; margin: 0;">👤 You ({message['timestamp']})</h4>
-                    <p style="color: white; margin: 10px 0 0 0;">{message['content']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="message-appear" style="background: linear-gradient(135deg, rgba(255, 107, 107, 0.2), rgba(255, 107, 107, 0.1)); 
-                     backdrop-filter: blur(10px); border-radius: 15px; padding: 15px; margin: 10px 0; 
-                     border-left: 4px solid #ff6b6b;">
-                    <h4 style="color: #ff6b6b; margin: 0;">🤖 Llama 3 ({message['timestamp']})</h4>
-                    <p style="color: white; margin: 10px 0 0 0;">{message['content']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            if i < len(st.session_state.messages) - 1:
-                st.markdown('<hr style="border: 1px solid rgba(255,255,255,0.2); margin: 20px 0;">', unsafe_allow_html=True)
+        # Messages spilled from memory are paged back in from the store
+        older = []
+        if start < spilled:
+            page = get_conversation_store().read(st.session_state.conversation_id, start, spilled - start)
+            older = [render_message_html(message, start + i) for i, message in enumerate(page)]
+        
+        # Heading and every visible message go out as one element
+        ui.render(
+            ui.CHAT_TITLE(),
+            MESSAGE_SEPARATOR.join(older + [get_message_html(i) for i in range(first, len(messages))]),
+        )
+        
+        # Bring a message picked from the search results into view
+        if "scroll_to" in st.session_state:
+            ui.scroll_to(st.session_state.pop("scroll_to"))
 
 def display_welcome_message():
     """Display animated welcome message"""
-    st.markdown("""
-    <div class="welcome-bounce" style="text-align: center; padding: 40px; 
-         background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.1)); 
-         backdrop-filter: blur(10px); border-radius: 20px; margin: 20px 0; 
-         border: 1px solid rgba(255,255,255,0.3);">
-        <h2 style="color: white; margin-bottom: 20px;">👋 Welcome to the AI Chat Experience!</h2>
-        <p style="color: rgba(255,255,255,0.8); font-size: 1.2rem;">
-            Start a conversation by asking a question above. I'm here to help with anything you need! 🚀
-        </p>
-        <div style="margin-top: 20px;">
-            <span style="font-size: 1.5rem; margin: 0 10px;">🌟</span>
-            <span style="font-size: 1.5rem; margin: 0 10px;">✨</span>
-            <span style="font-size: 1.5rem; margin: 0 10px;">💫</span>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    ui.render(ui.WELCOME())
 
 def clear_history():
     """Clear the conversation history"""
     st.session_state.messages = []
     st.session_state.conversation_count = 0
+    st.session_state.message_html = []
+    st.session_state.history_window = HISTORY_PAGE_SIZE
+    st.session_state.spilled = 0
+    st.session_state.conversation_id = ConversationStore.new_conversation_id()
+
+def resume_conversation(conversation_id: str) -> bool:
+    """Load one of this browser's stored conversations back into this session"""
+    if not get_conversation_store().owns(conversation_id, current_owner()):
+        return False
+    clear_history()
+    st.session_state.conversation_id = conversation_id
+    for msg in get_conversation_store().iter_messages(conversation_id):
+        st.session_state.messages.append(Message(msg["role"], msg["content"], msg["ts"]))
+        st.session_state.spilled += spill_messages(st.session_state.messages)
+        if msg["role"] != "user":
+            st.session_state.conversation_count += 1
+    compact_messages(st.session_state.messages)
+    return True
+
+def format_bytes(value) -> str:
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+def track_session_memory():
+    """Report this session's history to the process-wide accounting, reloading it if it was evicted"""
+    session_id = st.session_state.session_id
+    if SESSIONS.take_evicted(session_id):
+        # Reclaimed while idle; the conversation is persisted, so bring it back
+        resume_conversation(st.session_state.conversation_id)
+    SESSIONS.touch(
+        session_id,
+        st.session_state.messages,
+        st.session_state.message_html,
+    )
+
+def memory_stats_html() -> str:
+    """History memory held by this session and by every session in the process"""
+    total, sessions = SESSIONS.total()
+    return ui.stats_card(
+        "🧠 Memory",
+        f"This session: {format_bytes(SESSIONS.usage(st.session_state.session_id))}",
+        f"All sessions: {format_bytes(total)} across {sessions}",
+        f"Evicted idle sessions: {SESSIONS.stats['evicted_sessions']}",
+    )
+
+def jump_to_message(conversation_id: str, seq: int) -> bool:
+    """Show a stored message in the chat history; False if the conversation cannot be resumed"""
+    if conversation_id != st.session_state.conversation_id and not resume_conversation(conversation_id):
+        return False
+    st.session_state.history_window = max(st.session_state.history_window, total_message_count() - seq)
+    st.session_state.scroll_to = ui.message_anchor(seq)
+    return True
+
+def display_search():
+    """Search this conversation or every one this browser stored and jump to a match"""
+    with st.expander("🔎 Search History"):
+        query = st.text_input("Search", placeholder="Search messages...", label_visibility="collapsed")
+        everywhere = st.checkbox("All conversations")
+        if not query.strip():
+            return
+        results = get_conversation_store().search(
+            query, current_owner(), None if everywhere else st.session_state.conversation_id
+        )
+        if not results:
+            st.caption("No matching messages")
+            return
+        terms = search_terms(query)
+        for i, hit in enumerate(results):
+            author = "👤" if hit["role"] == "user" else "🤖"
+            if everywhere and hit["conversation_id"] != st.session_state.conversation_id:
+                st.caption(hit["title"] or "Untitled")
+            if st.button(f"{author} {hit['timestamp']} · {snippet(hit['content'], terms, 80)}",
+                         key=f"search_hit_{i}", use_container_width=True):
+                if not jump_to_message(hit["conversation_id"], hit["seq"]):
+                    # The conversation can no longer be resumed; show the message here instead
+                    st.info(hit["content"])
+
+def display_past_conversations():
+    """Let the user pick a stored conversation to resume"""
+    conversations = get_conversation_store().list_conversations(current_owner())
+    if not conversations:
+        return
+    with st.expander("📚 Past Conversations"):
+        labels = {
+            cid: f"{title or 'Untitled'} · {count} msgs · {datetime.fromtimestamp(updated).strftime('%b %d %H:%M')}"
+            for cid, title, updated, count in conversations
+        }
+        selected = st.selectbox("Conversation", list(labels), format_func=labels.get, label_visibility="collapsed")
+        if st.button("↩️ Resume", use_container_width=True, disabled=selected == st.session_state.conversation_id):
+            resume_conversation(selected)
+            st.rerun()
+
+@st.cache_resource
+def start_background_warmup():
+    """Import the inference stack and build the Bedrock client off the script thread"""
+    def warm():
+        # Streaming goes straight to invoke_model, so the app never needs LangChain
+        import inference
+        inference.warm_up(include_llm=False)
+        # Keep answers to the suggested questions warm in the response cache
+        PREFETCHER.start(inference.refresh_answer, inference.answer_age)
+
+    thread = threading.Thread(target=warm, name="bedrock-warmup", daemon=True)
+    thread.start()
+    return thread
 
 def main():
     st.set_page_config(
@@ -372,25 +281,34 @@ def main():
     )
     
     # Add custom animations
-    add_custom_animations()
+    browser_id = add_custom_animations()
     
     # Display animated header
     display_animated_header()
     
     # Initialize session state
     initialize_session_state()
+    if browser_id:
+        st.session_state.browser_id = browser_id
+    setup_metrics()
+    # Eviction skips this session until the run ends, so its history is not cleared mid-run
+    with SESSIONS.running(st.session_state.session_id):
+        track_session_memory()
+        render_page()
+
+def render_page():
+    # The UI shell above is already painted; load boto3 and the client in the background
+    start_background_warmup()
     
     # Sidebar for conversation management
     with st.sidebar:
-        st.markdown("""
-        <div style="text-align: center; padding: 20px; background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.1)); 
-             backdrop-filter: blur(10px); border-radius: 15px; margin-bottom: 20px; border: 1px solid rgba(255,255,255,0.3);">
-            <h2 style="color: white; margin: 0;">🎛️ Control Panel</h2>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Display animated metrics
-        display_animated_metrics(len(st.session_state.messages), st.session_state.conversation_count)
+        # Title, metric cards and live latency/token stats in one element
+        ui.render(
+            ui.PANEL_TITLE(animation="", tag="h2", title="🎛️ Control Panel"),
+            metrics_html(total_message_count(), st.session_state.conversation_count),
+            live_stats_html(),
+            memory_stats_html(),
+        )
         
         # Clear history button
         if st.button("🗑️ Clear History", use_container_width=True):
@@ -399,33 +317,34 @@ def main():
         
         # Export conversation button
         if st.session_state.messages:
+            export_format = st.selectbox("Export format", list(EXPORT_FORMATS), format_func=str.upper)
             if st.button("📁 Export Conversation", use_container_width=True):
-                # Create export text
-                export_text = ""
-                for msg in st.session_state.messages:
-                    role = "You" if msg["role"] == "user" else "Llama 3"
-                    export_text += f"{role} ({msg['timestamp']}):\n{msg['content']}\n\n"
+                # download_button holds the whole file in memory anyway, so build it as bytes
+                mime, extension = EXPORT_FORMATS[export_format]
+                export_data = "".join(
+                    get_conversation_store().iter_export(st.session_state.conversation_id, export_format)
+                ).encode("utf-8")
                 
                 st.download_button(
-                    label="📥 Download as Text",
-                    data=export_text,
-                    file_name=f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                    mime="text/plain",
+                    label=f"📥 Download as {export_format.upper()}",
+                    data=export_data,
+                    file_name=f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime,
                     use_container_width=True
                 )
+        
+        # Search stored messages
+        display_search()
+        
+        # Resume a stored conversation
+        display_past_conversations()
     
     # Main chat interface
     col1, col2 = st.columns([2, 1])
     
     with col1:
         # Input section
-        st.markdown("""
-        <div class="slide-in-left" style="background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.1)); 
-             backdrop-filter: blur(10px); border-radius: 15px; padding: 20px; margin-bottom: 20px; 
-             border: 1px solid rgba(255,255,255,0.3);">
-            <h3 style="color: white; text-align: center; margin: 0;">💭 Ask Your Question</h3>
-        </div>
-        """, unsafe_allow_html=True)
+        ui.render(ui.PANEL_TITLE(animation="slide-in-left", tag="h3", title="💭 Ask Your Question"))
         
         question = st.text_area(
             "Enter your question here:",
@@ -434,6 +353,12 @@ def main():
             label_visibility="collapsed"
         )
         
+        suggestion = st.selectbox(
+            "Suggested questions",
+            PREFETCHER.questions,
+            label_visibility="collapsed"
+        )
+        
         # Submit button
         col_submit, col_example = st.columns([1, 1])
         
@@ -442,77 +367,80 @@ def main():
         
         with col_example:
             if st.button("💡 Example Question", use_container_width=True):
-                st.session_state.example_question = "Explain the concept of artificial intelligence in simple terms."
+                st.session_state.example_question = suggestion
         
         # Handle example question
+        suggested = False
         if hasattr(st.session_state, 'example_question'):
             question = st.session_state.example_question
             del st.session_state.example_question
             submit_clicked = True
+            # Suggestions are asked standalone so the prefetched answer matches
+            suggested = True
+            PREFETCHER.mark_used(question)
         
         # Process the question
         if submit_clicked:
             if question.strip() == "":
                 st.warning("⚠️ Please enter a question.")
             else:
+                # Mask secrets and personal data before the question is shown, stored or sent
+                question = redact(question)
+                
                 # Add user message to history
                 add_message("user", question)
                 
-                with st.spinner("🤔 Generating answer..."):
-                    try:
-                        answer = ask_llama3(question)
-                        
-                        # Extract the actual response text if it's a dict
-                        if isinstance(answer, dict) and 'text' in answer:
-                            answer_text = answer['text']
+                try:
+                    # Imported here so the first page paint never waits on boto3
+                    from inference import ask_llama3_stream
+                    
+                    status = st.empty()
+                    
+                    def show_queue_position(position):
+                        if position:
+                            status.info(f"⏳ Waiting for a free slot: you are number {position} in the queue")
                         else:
-                            answer_text = str(answer)
-                        
-                        # Add assistant message to history
-                        add_message("assistant", answer_text)
-                        st.session_state.conversation_count += 1
-                        
-                        # Show success message
-                        st.success("✅ Answer generated successfully!")
-                        
-                        # Auto-scroll to the latest response by rerunning
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"❌ Error generating response: {str(e)}")
+                            status.empty()
+                    
+                    # Render chunks as they arrive instead of blocking on the full answer
+                    answer_text = st.write_stream(
+                        ask_llama3_stream(
+                            question,
+                            () if suggested else st.session_state.messages[:-1],
+                            session=st.session_state.session_id,
+                            on_wait=show_queue_position,
+                        )
+                    )
+                    
+                    # Add assistant message to history
+                    add_message("assistant", answer_text)
+                    st.session_state.conversation_count += 1
+                    
+                    # Show success message
+                    st.success("✅ Answer generated successfully!")
+                    
+                    # Auto-scroll to the latest response by rerunning
+                    st.rerun()
+                    
+                except QueueFullError as e:
+                    st.warning(f"⏳ {e}")
+                except Exception as e:
+                    st.error(f"❌ Error generating response: {str(e)}")
     
     with col2:
         # Quick actions
-        st.markdown("""
-        <div class="slide-in-right" style="background: linear-gradient(135deg, rgba(255,255,255,0.2), rgba(255,255,255,0.1)); 
-             backdrop-filter: blur(10px); border-radius: 15px; padding: 20px; margin-bottom: 20px; 
-             border: 1px solid rgba(255,255,255,0.3);">
-            <h3 style="color: white; text-align: center; margin: 0;">⚡ Quick Actions</h3>
-        </div>
-        """, unsafe_allow_html=True)
+        ui.render(ui.PANEL_TITLE(animation="slide-in-right", tag="h3", title="⚡ Quick Actions"))
         
         if st.button("🔄 New Conversation", use_container_width=True):
             clear_history()
             st.rerun()
         
-        # Show some stats
+        # Show session stats and last interaction time
         if st.session_state.messages:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4 style="color: white; margin: 0;">📊 Session Stats</h4>
-                <p style="color: rgba(255,255,255,0.8); margin: 5px 0;">Total messages: {len(st.session_state.messages)}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Show last interaction time
-            if st.session_state.messages:
-                last_msg = st.session_state.messages[-1]
-                st.markdown(f"""
-                <div class="stats-card">
-                    <h4 style="color: white; margin: 0;">🕒 Last Activity</h4>
-                    <p style="color: rgba(255,255,255,0.8); margin: 5px 0;">{last_msg['timestamp']}</p>
-                </div>
-                """, unsafe_allow_html=True)
+            ui.render(
+                ui.stats_card("📊 Session Stats", f"Total messages: {total_message_count()}"),
+                ui.stats_card("🕒 Last Activity", st.session_state.messages[-1].timestamp),
+            )
     
     # Display conversation history or welcome message
     if st.session_state.messages:
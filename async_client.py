@@ -0,0 +1,78 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+
+from clients import MODEL_ID
+from metrics import instrument_client
+from prompts import MODEL_KWARGS, build_body, build_prompt
+from ratelimit import GUARD, request_tokens
+from redact import redact
+
+# Mirrors clients.BEDROCK_CONFIG for the non-blocking client
+ASYNC_BEDROCK_CONFIG = AioConfig(
+    max_pool_connections=100,
+    retries={"max_attempts": 1, "mode": "standard"},
+    connect_timeout=5,
+    read_timeout=120,
+)
+
+
+@asynccontextmanager
+async def async_bedrock_client(region_name=None, endpoint_url=None):
+    """Yield an instrumented bedrock-runtime client for the current event loop"""
+    async with get_session().create_client(
+        "bedrock-runtime",
+        region_name=region_name,
+        endpoint_url=endpoint_url,
+        config=ASYNC_BEDROCK_CONFIG,
+    ) as client:
+        yield instrument_client(client)
+
+
+async def ask_llama3_async(question: str, client=None, timeout=None) -> str:
+    """Ask Llama 3 without tying up a thread while the model generates"""
+    if client is None:
+        async with async_bedrock_client() as client:
+            return await ask_llama3_async(question, client, timeout)
+
+    prompt = redact(build_prompt(question))
+    body = build_body(prompt)
+
+    async def invoke():
+        response = await client.invoke_model(
+            body=body,
+            modelId=MODEL_ID,
+            accept="application/json",
+            contentType="application/json",
+        )
+        payload = await response["body"].read()
+        return redact(json.loads(payload)["generation"])
+
+    async def call():
+        return await GUARD.acall(invoke, request_tokens(prompt, MODEL_KWARGS))
+
+    return await asyncio.wait_for(call(), timeout)
+
+
+async def gather_answers(questions, concurrency=32, timeout=None, client=None):
+    """Answer many questions concurrently over one connection pool.
+
+    At most ``concurrency`` generations are in flight at once. Results come
+    back in question order; a question that fails or exceeds ``timeout``
+    yields its exception instead of an answer. Cancelling the caller cancels
+    every outstanding request.
+    """
+    if client is None:
+        async with async_bedrock_client() as client:
+            return await gather_answers(questions, concurrency, timeout, client)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(question):
+        async with semaphore:
+            return await ask_llama3_async(question, client, timeout)
+
+    return await asyncio.gather(*(answer(q) for q in questions), return_exceptions=True)
@@ -0,0 +1,246 @@
+"""Run a JSONL file of Bedrock invoke_model records and write ordered results.
+
+Each input record has the same shape as test.json: ``modelId``,
+``contentType``, ``accept`` and a ``body`` (JSON string or object).
+
+    python batch.py requests.jsonl results.jsonl --concurrency 8
+    python batch.py requests.jsonl results.jsonl --resume
+    python batch.py requests.jsonl batch_input.jsonl --emit-batch-input
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+
+from clients import BEDROCK_CONFIG
+from metrics import METRICS, instrument_client
+from ratelimit import GUARD, THROTTLE_CODES, TRANSIENT_CODES, CircuitOpenError, error_code, request_tokens
+
+# Failures worth retrying later; the rest are written out as the record's result
+RETRY_LATER_CODES = THROTTLE_CODES | TRANSIENT_CODES | {"ConnectionError"}
+
+
+# Longest record collected across lines before it is given up as malformed
+MAX_RECORD_CHARS = 1024 * 1024
+
+
+class MalformedRecord(ValueError):
+    """Yielded in place of an input record that is not a JSON object"""
+
+
+def iter_records(path, skip=0):
+    """Yield (index, record) pairs one at a time, tolerating pretty-printed records.
+
+    A record that does not parse is yielded as a MalformedRecord naming its
+    first line. Any line starting with ``{`` begins a new record, and a record
+    that outgrows MAX_RECORD_CHARS is skipped up to the next one, so a bad
+    record never swallows the valid records after it.
+    """
+    index = 0
+    buffer = []  # None while skipping the rest of an oversized record
+    size = start = 0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if buffer and line.startswith("{"):
+                if index >= skip:
+                    yield index, MalformedRecord(f"{path}:{start}: malformed record")
+                index += 1
+                buffer = []
+            if buffer is None:
+                if not line.startswith("{"):
+                    continue
+                buffer = []
+            if not buffer:
+                if not line.strip():
+                    continue
+                size, start = 0, number
+            buffer.append(line)
+            size += len(line)
+            record = None
+            # Only a line closing an object can complete a record
+            if line.rstrip().endswith("}"):
+                try:
+                    record = json.loads("".join(buffer))
+                except json.JSONDecodeError:
+                    pass
+            if isinstance(record, dict):
+                buffer = []
+            elif size > MAX_RECORD_CHARS:
+                record = MalformedRecord(f"{path}:{start}: record longer than {MAX_RECORD_CHARS} characters")
+                buffer = None
+            else:
+                continue
+            if index >= skip:
+                yield index, record
+            index += 1
+    if buffer:
+        if index >= skip:
+            yield index, MalformedRecord(f"{path}:{start}: incomplete record at end of file")
+
+
+def completed_count(path):
+    """Count finished result lines, dropping a torn trailing line from a crash"""
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    good_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            count += 1
+            good_bytes += len(line)
+    if good_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    return count
+
+
+def invoke_record(client, record):
+    """Send one record to invoke_model and return the decoded response body"""
+    body = record["body"]
+    if not isinstance(body, str):
+        body = json.dumps(body)
+    response = client.invoke_model(
+        body=body,
+        modelId=record["modelId"],
+        accept=record.get("accept", "application/json"),
+        contentType=record.get("contentType", "application/json"),
+    )
+    return json.loads(response["body"].read())
+
+
+def record_body(record) -> dict:
+    """A record's request body as a dict; ValueError if it is missing or not a JSON object"""
+    body = record.get("body")
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"record 'body' is not valid JSON: {e}") from e
+    if not isinstance(body, dict):
+        raise ValueError("record has no JSON object 'body'")
+    return body
+
+
+def record_tokens(record):
+    """Estimate a record's token cost from its prompt and max_gen_len"""
+    body = record_body(record)
+    return request_tokens(body.get("prompt", ""), body)
+
+
+def retry_later(exc) -> bool:
+    """Whether a failure is transient, so the record should be retried rather than recorded"""
+    return isinstance(exc, CircuitOpenError) or error_code(exc) in RETRY_LATER_CODES
+
+
+def run_record(client, index, record):
+    """Invoke a record under the shared rate limits and return its result line"""
+    if isinstance(record, MalformedRecord):
+        return {"index": index, "recordId": str(index), "error": str(record)}
+    record_id = record.get("recordId", str(index))
+    try:
+        output = GUARD.call(lambda: invoke_record(client, record), record_tokens(record))
+    except Exception as e:
+        if retry_later(e):
+            raise
+        return {"index": index, "recordId": record_id, "error": str(e)}
+    return {"index": index, "recordId": record_id, "modelOutput": output}
+
+
+def run_batch(input_path, output_path, client, concurrency=8, resume=False):
+    """Process every record, writing results to output_path in input order.
+
+    A transient failure (throttling that outlasted the retries, a 5xx, an
+    open circuit) stops the run and is re-raised. That record and every later
+    one stay unwritten, so ``resume=True`` picks up from it.
+    """
+    done = completed_count(output_path) if resume else 0
+    pending = deque()
+    written = 0
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def flush(block):
+            nonlocal written
+            while pending and (block or pending[0].done()):
+                out.write(json.dumps(pending.popleft().result()) + "\n")
+                out.flush()
+                written += 1
+
+        try:
+            for index, record in iter_records(input_path, skip=done):
+                pending.append(pool.submit(run_record, client, index, record))
+                flush(block=False)
+                # Bound the read-ahead so huge inputs never sit in memory
+                while len(pending) >= concurrency * 2:
+                    pending[0].exception()
+                    flush(block=False)
+            flush(block=True)
+        except Exception:
+            pool.shutdown(cancel_futures=True)
+            raise
+    return done, written
+
+
+def emit_batch_input(input_path, output_path):
+    """Convert records into the Bedrock Batch Inference recordId/modelInput format"""
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for index, record in iter_records(input_path):
+            if isinstance(record, MalformedRecord):
+                print(f"Skipping {record}", file=sys.stderr)
+                continue
+            try:
+                body = record_body(record)
+            except ValueError as e:
+                print(f"Skipping {input_path} record {index}: {e}", file=sys.stderr)
+                continue
+            record_id = record.get("recordId", f"REC{index:011d}")
+            out.write(json.dumps({"recordId": record_id, "modelInput": body}) + "\n")
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of invoke_model records")
+    parser.add_argument("output", help="JSONL file to write results to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--resume", action="store_true",
+                        help="skip records already present in the output file")
+    parser.add_argument("--endpoint-url", help="send requests to a local bedrock-runtime stub")
+    parser.add_argument("--region", default=None)
+    parser.add_argument("--emit-batch-input", action="store_true",
+                        help="write Bedrock Batch Inference input instead of invoking")
+    args = parser.parse_args(argv)
+
+    if args.emit_batch_input:
+        count = emit_batch_input(args.input, args.output)
+        print(f"Wrote {count} records to {args.output}")
+        return 0
+
+    config = BEDROCK_CONFIG.merge(Config(max_pool_connections=args.concurrency))
+    client = instrument_client(boto3.client(
+        "bedrock-runtime", region_name=args.region, endpoint_url=args.endpoint_url, config=config
+    ))
+    try:
+        skipped, written = run_batch(args.input, args.output, client, args.concurrency, args.resume)
+    except Exception as e:
+        if not retry_later(e):
+            raise
+        print(f"Stopped on a transient error: {e}", file=sys.stderr)
+        print(f"Results so far are in {args.output}; rerun with --resume to continue", file=sys.stderr)
+        return 1
+    print(f"Wrote {written} results to {args.output} (resumed after {skipped})")
+    print(json.dumps(METRICS.snapshot(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
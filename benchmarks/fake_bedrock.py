@@ -0,0 +1,181 @@
+"""Local stand-in for the bedrock-runtime InvokeModel APIs.
+
+    python benchmarks/fake_bedrock.py --port 8765 --latency 0.2 --token-rate 80
+
+Point boto3 at it with AWS_ENDPOINT_URL_BEDROCK_RUNTIME=http://127.0.0.1:8765.
+Blocking calls sleep for latency + output_tokens / token_rate; streaming
+calls emit one event-stream chunk every ``--chunk-tokens`` tokens at the
+same rate. ``--throttle-rate`` and ``--error-rate`` inject 429
+ThrottlingException and 500 InternalServerException responses.
+GET /_stats returns how many TCP connections were accepted and how many
+requests they carried.
+"""
+import argparse
+import base64
+import json
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def encode_event(payload: bytes, event_type="chunk") -> bytes:
+    """Frame a payload as one AWS event-stream message"""
+    headers = b""
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"),
+                        (":message-type", "event")):
+        name, value = name.encode(), value.encode()
+        headers += struct.pack(">B", len(name)) + name + b"\x07" + struct.pack(">H", len(value)) + value
+    prelude = struct.pack(">II", 12 + len(headers) + len(payload) + 4, len(headers))
+    prelude += struct.pack(">I", zlib.crc32(prelude))
+    message = prelude + headers + payload
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def chunk_event(data: dict) -> bytes:
+    encoded = base64.b64encode(json.dumps(data).encode()).decode()
+    return encode_event(json.dumps({"bytes": encoded}).encode())
+
+
+class FakeBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.count("connections")
+
+    def count(self, name):
+        options = self.options
+        with options.lock:
+            options.stats[name] += 1
+
+    def do_GET(self):
+        if self.path != "/_stats":
+            return self.send_error_response(404, "ResourceNotFoundException")
+        with self.options.lock:
+            body = json.dumps(self.options.stats).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_response(self, status, code):
+        body = json.dumps({"message": f"Injected {code}"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("x-amzn-ErrorType", f"{code}:http://internal.amazon.com/coral/com.amazon.bedrock/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        options = self.options
+        self.count("requests")
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        roll = random.random()
+        if roll < options.throttle_rate:
+            return self.send_error_response(429, "ThrottlingException")
+        if roll < options.throttle_rate + options.error_rate:
+            return self.send_error_response(500, "InternalServerException")
+
+        input_tokens = max(1, len(request.get("prompt", "")) // 4)
+        output_tokens = min(options.output_tokens, request.get("max_gen_len", options.output_tokens))
+        if self.path.endswith("/invoke-with-response-stream"):
+            self.stream(input_tokens, output_tokens)
+        elif self.path.endswith("/invoke"):
+            self.invoke(input_tokens, output_tokens)
+        else:
+            self.send_error_response(404, "ResourceNotFoundException")
+
+    def invoke(self, input_tokens, output_tokens):
+        options = self.options
+        time.sleep(options.latency + output_tokens / options.token_rate)
+        body = json.dumps({
+            "generation": "word " * output_tokens,
+            "prompt_token_count": input_tokens,
+            "generation_token_count": output_tokens,
+            "stop_reason": "length",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-amzn-bedrock-input-token-count", str(input_tokens))
+        self.send_header("x-amzn-bedrock-output-token-count", str(output_tokens))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def stream(self, input_tokens, output_tokens):
+        options = self.options
+        started = time.perf_counter()
+        time.sleep(options.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("x-amzn-bedrock-content-type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        first_byte = time.perf_counter() - started
+        sent = 0
+        while sent < output_tokens:
+            step = min(options.chunk_tokens, output_tokens - sent)
+            time.sleep(step / options.token_rate)
+            sent += step
+            data = {"generation": "word " * step, "generation_token_count": sent, "stop_reason": None}
+            if sent == output_tokens:
+                data["stop_reason"] = "length"
+                data["amazon-bedrock-invocationMetrics"] = {
+                    "inputTokenCount": input_tokens,
+                    "outputTokenCount": output_tokens,
+                    "invocationLatency": int((time.perf_counter() - started) * 1000),
+                    "firstByteLatency": int(first_byte * 1000),
+                }
+            self.write_chunk(chunk_event(data))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(port=0, latency=0.2, token_rate=80.0, output_tokens=128, chunk_tokens=8,
+          throttle_rate=0.0, error_rate=0.0):
+    """Start the fake server and return it; the bound port is server.server_port"""
+    options = argparse.Namespace(latency=latency, token_rate=token_rate, output_tokens=output_tokens,
+                                 chunk_tokens=chunk_tokens, throttle_rate=throttle_rate,
+                                 error_rate=error_rate, lock=threading.Lock(),
+                                 stats={"connections": 0, "requests": 0})
+    handler = type("Handler", (FakeBedrockHandler,), {"options": options})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake bedrock-runtime server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--token-rate", type=float, default=80.0, help="output tokens per second")
+    parser.add_argument("--output-tokens", type=int, default=128)
+    parser.add_argument("--chunk-tokens", type=int, default=8)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    server = serve(args.port, args.latency, args.token_rate, args.output_tokens,
+                   args.chunk_tokens, args.throttle_rate, args.error_rate)
+    print(server.server_port, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
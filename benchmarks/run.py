@@ -0,0 +1,640 @@
+"""End-to-end benchmark suite against a local fake bedrock-runtime.
+
+    python benchmarks/run.py                       # run and compare with benchmarks/baseline.json
+    python benchmarks/run.py --save-baseline       # record the current numbers as the baseline
+    python benchmarks/run.py --only ask_llama3,batch --latency 0.05 --throttle-rate 0.1
+
+Each scenario runs in a fresh interpreter, so its memory high-water mark
+and warm-up costs are its own. Results are written to
+benchmarks/results.json. A metric that is worse than the baseline by more
+than --tolerance makes the run exit with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fake_bedrock  # noqa: E402
+
+# Metrics where a larger value is better; everything else is lower-is-better
+HIGHER_IS_BETTER = ("_rps", "_speedup")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+def latency_stats(prefix, latencies, elapsed):
+    return {
+        f"{prefix}_rps": len(latencies) / elapsed if elapsed else None,
+        f"{prefix}_p50_s": percentile(latencies, 0.5),
+        f"{prefix}_p99_s": percentile(latencies, 0.99),
+    }
+
+
+def max_rss_kb(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def peak_rss_kb():
+    """This process's own peak RSS.
+
+    On Linux ru_maxrss survives exec, so a child would start from its
+    parent's peak; VmHWM belongs to the current program image only.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return max_rss_kb()
+
+
+def unique_question():
+    return f"Benchmark question {uuid.uuid4().hex}: explain artificial intelligence simply."
+
+
+def run_concurrently(fn, requests, concurrency):
+    """Call fn() `requests` times on `concurrency` threads; return (latencies, errors, elapsed)"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def timed_subprocess(args, env, repeat=3):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def bench_startup(ctx):
+    env = ctx["env"]
+    return {
+        "inference_import_s": timed_subprocess([sys.executable, "-c", "import inference"], env),
+        "app_import_s": timed_subprocess([sys.executable, "-c", "import app"], env),
+    }
+
+
+def import_times(statement, env):
+    """Cumulative seconds per module imported by statement, from ``python -X importtime``.
+
+    Nested imports are included in their importer's time; a module is listed
+    under the first import that loaded it.
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                             cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        fields = line.partition("import time:")[2].split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times.setdefault(fields[2].strip(), int(fields[1]) / 1e6)
+    return times
+
+
+def bench_import_time(ctx):
+    """Import cost of app.py with the inference stack deferred, and what an eager import adds"""
+    deferred = import_times("import app", ctx["env"])
+    eager = import_times("import app, inference", ctx["env"])
+    return {
+        "importtime_app_s": deferred.get("app"),
+        # Zero while boto3 stays off the first-paint path
+        "importtime_app_boto3_s": deferred.get("boto3", 0.0),
+        "importtime_app_langchain_s": deferred.get("langchain_aws", 0.0),
+        "importtime_eager_s": eager.get("app", 0.0) + eager.get("inference", 0.0),
+        "importtime_eager_boto3_s": eager.get("boto3", 0.0),
+        "importtime_streamlit_s": deferred.get("streamlit", 0.0),
+    }
+
+
+def bench_ask_llama3(ctx):
+    from inference import ask_llama3
+
+    latencies, errors, elapsed = run_concurrently(
+        lambda: ask_llama3(unique_question()), ctx["requests"], ctx["concurrency"])
+    return {**latency_stats("ask_llama3", latencies, elapsed), "ask_llama3_errors": errors}
+
+
+def bench_ask_llama3_stream(ctx):
+    from inference import ask_llama3_stream
+
+    first_tokens = []
+    lock = threading.Lock()
+
+    def one():
+        started = time.perf_counter()
+        chunks = ask_llama3_stream(unique_question())
+        next(chunks)
+        with lock:
+            first_tokens.append(time.perf_counter() - started)
+        for _ in chunks:
+            pass
+
+    latencies, errors, elapsed = run_concurrently(one, ctx["requests"], ctx["concurrency"])
+    return {
+        **latency_stats("stream", latencies, elapsed),
+        "stream_ttft_p50_s": percentile(first_tokens, 0.5),
+        "stream_ttft_p99_s": percentile(first_tokens, 0.99),
+        "stream_errors": errors,
+    }
+
+
+def bench_async_gather(ctx):
+    from async_client import async_bedrock_client, gather_answers
+
+    questions = [unique_question() for _ in range(ctx["requests"])]
+
+    async def main():
+        async with async_bedrock_client(endpoint_url=ctx["endpoint"]) as client:
+            started = time.perf_counter()
+            results = await gather_answers(questions, concurrency=ctx["concurrency"], client=client)
+            return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+    errors = sum(isinstance(r, BaseException) for r in results)
+    return {"async_rps": (len(results) - errors) / elapsed, "async_errors": errors}
+
+
+def bench_llama3_script(ctx):
+    return {"llama3_script_s": timed_subprocess([sys.executable, "llama3.py"], ctx["env"])}
+
+
+def bench_streamlit(ctx):
+    from streamlit.testing.v1 import AppTest
+
+    started = time.perf_counter()
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+    at.run()
+    first_run = time.perf_counter() - started
+
+    started = time.perf_counter()
+    at.run()
+    rerun = time.perf_counter() - started
+    # HTML/CSS resent on every rerun; the bulk of each websocket delta
+    markdown_bytes = sum(len(m.value.encode("utf-8")) for m in at.markdown)
+
+    started = time.perf_counter()
+    example = next(b for b in at.button if b.label.startswith("💡"))
+    example.click().run()
+    question_run = time.perf_counter() - started
+    return {
+        "streamlit_first_run_s": first_run,
+        "streamlit_rerun_s": rerun,
+        "streamlit_rerun_markdown_bytes": markdown_bytes,
+        "streamlit_question_s": question_run,
+        "streamlit_exceptions": len(at.exception),
+    }
+
+
+def server_stats(ctx):
+    """Connections accepted and requests served so far by the fake server"""
+    with urllib.request.urlopen(ctx["endpoint"] + "/_stats") as response:
+        return json.load(response)
+
+
+def bench_connections(ctx):
+    """New TCP connections per request: the shared client vs a client per request.
+
+    Against Bedrock every new connection is also a TLS handshake.
+    """
+    import boto3
+    from clients import BEDROCK_CONFIG, MODEL_ID, get_bedrock_client
+    from prompts import build_body, build_prompt
+
+    def invoke(client):
+        response = client.invoke_model(body=build_body(build_prompt(unique_question())), modelId=MODEL_ID,
+                                       accept="application/json", contentType="application/json")
+        response["body"].read()
+
+    def connections_per_request(fn, requests):
+        before = server_stats(ctx)
+        _, errors, _ = run_concurrently(fn, requests, ctx["concurrency"])
+        after = server_stats(ctx)
+        served = after["requests"] - before["requests"]
+        return (after["connections"] - before["connections"]) / served if served else None, errors
+
+    shared, shared_errors = connections_per_request(lambda: invoke(get_bedrock_client()), ctx["requests"])
+    # Building a client costs tens of milliseconds, so sample fewer requests
+    fresh, fresh_errors = connections_per_request(
+        lambda: invoke(boto3.client("bedrock-runtime", config=BEDROCK_CONFIG)), min(ctx["requests"], 32))
+    return {
+        "connections_shared_client_per_request": shared,
+        "connections_fresh_client_per_request": fresh,
+        "connections_errors": shared_errors + fresh_errors,
+    }
+
+
+def bench_batch(ctx):
+    import boto3
+    import batch
+    from clients import BEDROCK_CONFIG, MODEL_ID
+    from prompts import build_record, render_many
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = Path(tmp, "in.jsonl"), Path(tmp, "out.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            questions = (unique_question() for _ in range(ctx["requests"]))
+            for body in render_many(questions):
+                f.write(json.dumps(build_record(body, MODEL_ID)) + "\n")
+        client = boto3.client("bedrock-runtime", endpoint_url=ctx["endpoint"], config=BEDROCK_CONFIG)
+        started = time.perf_counter()
+        batch.run_batch(str(input_path), str(output_path), client, ctx["concurrency"])
+        elapsed = time.perf_counter() - started
+        with open(output_path, encoding="utf-8") as f:
+            errors = sum("error" in json.loads(line) for line in f)
+    return {"batch_rps": ctx["requests"] / elapsed, "batch_errors": errors}
+
+
+def bench_api(ctx):
+    import api
+
+    async def call(path, payload):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": json.dumps(payload).encode()}
+
+        async def send(message):
+            messages.append(message)
+
+        await api.app({"type": "http", "method": "POST", "path": path}, receive, send)
+        return messages[0]["status"]
+
+    async def main():
+        latencies, statuses = [], []
+
+        async def one():
+            started = time.perf_counter()
+            statuses.append(await call("/v1/generate", {"question": unique_question()}))
+            if statuses[-1] == 200:
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(ctx["requests"])))
+        return latencies, statuses, time.perf_counter() - started
+
+    latencies, statuses, elapsed = asyncio.run(main())
+    return {**latency_stats("api", latencies, elapsed), "api_rejected": statuses.count(429)}
+
+
+def bench_history_render(ctx):
+    import app
+    from memory import Message
+
+    results = {}
+    for n in (10, 100, 1000):
+        messages = [Message("user" if i % 2 == 0 else "assistant", "Lorem ipsum dolor sit amet " * 20)
+                    for i in range(n)]
+        started = time.perf_counter()
+        fragments = [app.render_message_html(m, i) for i, m in enumerate(messages)]
+        app.MESSAGE_SEPARATOR.join(fragments)
+        results[f"history_render_{n}_cold_s"] = time.perf_counter() - started
+        started = time.perf_counter()
+        app.MESSAGE_SEPARATOR.join(fragments[-app.HISTORY_PAGE_SIZE:])
+        results[f"history_render_{n}_cached_s"] = time.perf_counter() - started
+    return results
+
+
+def bench_prompt_build(ctx):
+    from langchain.prompts import PromptTemplate
+    from prompts import MODEL_KWARGS, QUESTION_TEMPLATE, build_body, build_prompt, render_many
+
+    questions = [f"Question number {i} about generative AI?" for i in range(20000)]
+    template = PromptTemplate(template=QUESTION_TEMPLATE, input_variables=["question"])
+
+    started = time.perf_counter()
+    for q in questions:
+        json.dumps({"prompt": template.format(question=q), **MODEL_KWARGS})
+    langchain_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for q in questions:
+        build_body(build_prompt(q))
+    builder_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in render_many(questions):
+        pass
+    bulk_s = time.perf_counter() - started
+    return {
+        "prompt_langchain_s": langchain_s,
+        "prompt_builder_s": builder_s,
+        "prompt_bulk_s": bulk_s,
+        "prompt_builder_speedup": langchain_s / builder_s,
+    }
+
+
+def bench_scheduler(ctx):
+    """Skewed load on a stub backend: one session floods, eight ask one question at a time"""
+    from scheduler import Scheduler
+
+    def simulate(fair):
+        scheduler = Scheduler(max_concurrency=4, max_queue=1000, max_per_session=1000)
+        light = []
+
+        def call(session, latencies):
+            started = time.perf_counter()
+            # Without fair queuing everyone shares a single FIFO lane
+            with scheduler.slot(session if fair else "-", 600):
+                time.sleep(0.02)
+            latencies.append(time.perf_counter() - started)
+
+        def light_user(name):
+            for _ in range(5):
+                call(name, light)
+
+        heavy = [threading.Thread(target=call, args=("heavy", [])) for _ in range(120)]
+        users = [threading.Thread(target=light_user, args=(f"user-{i}",)) for i in range(8)]
+        for t in heavy:
+            t.start()
+        time.sleep(0.01)
+        for t in users:
+            t.start()
+        for t in users + heavy:
+            t.join()
+        return percentile(light, 0.99)
+
+    fair_p99, fifo_p99 = simulate(True), simulate(False)
+    return {"scheduler_fair_light_p99_s": fair_p99, "scheduler_fifo_light_p99_s": fifo_p99,
+            "scheduler_fairness_speedup": fifo_p99 / fair_p99}
+
+
+def bench_redaction(ctx):
+    """Masking cost per kilobyte: single pass vs one regex scan per entity, and streamed"""
+    import re
+    from redact import PATTERNS, Redactor
+
+    text = ("Llama 3 is a family of large language models. Contact jane@example.com or "
+            "call 555-123-4567 about card 4111 1111 1111 1111 in 2024. ") * 64
+    kilobytes = len(text) / 1024
+    redactor = Redactor()
+    sequential = [re.compile(p) for p in PATTERNS.values()]
+    denylist = Redactor(denylist=[f"codename{i}" for i in range(1000)])
+
+    def per_kb(fn, repeat=50):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat / kilobytes
+
+    single_s = per_kb(lambda: redactor.redact(text))
+    sequential_s = per_kb(lambda: [p.sub("{X}", text) for p in sequential])
+    chunks = [text[i:i + 16] for i in range(0, len(text), 16)]
+    return {
+        "redaction_single_pass_us_per_kb": single_s * 1e6,
+        "redaction_sequential_us_per_kb": sequential_s * 1e6,
+        "redaction_single_pass_speedup": sequential_s / single_s,
+        "redaction_stream_us_per_kb": per_kb(lambda: "".join(redactor.stream(chunks))) * 1e6,
+        "redaction_denylist_1000_us_per_kb": per_kb(lambda: denylist.redact(text)) * 1e6,
+    }
+
+
+def bench_session_memory(ctx):
+    """Bytes held per chat turn: dict with a formatted timestamp vs the compact, compressed record"""
+    from memory import Message, compact_messages, history_nbytes
+
+    words = "Llama 3 answers questions about AWS Bedrock streaming latency tokens and regions".split()
+    rng = random.Random(0)
+    turns = [("user" if i % 2 == 0 else "assistant",
+              " ".join(rng.choice(words) for _ in range(30 if i % 2 == 0 else 250)))
+             for i in range(200)]
+    dicts = [{"role": role, "content": content, "timestamp": "12:00:00"} for role, content in turns]
+    messages = [Message(role, content) for role, content in turns]
+    compact_messages(messages)
+    started = time.perf_counter()
+    for message in messages:
+        message.content
+    read_s = (time.perf_counter() - started) / len(messages)
+    dict_bytes = history_nbytes(dicts) / len(turns)
+    compact_bytes = history_nbytes(messages) / len(turns)
+    return {
+        "session_memory_dict_bytes_per_turn": dict_bytes,
+        "session_memory_compact_bytes_per_turn": compact_bytes,
+        "session_memory_read_us_per_turn": read_s * 1e6,
+    }
+
+
+def bench_search(ctx, messages=100_000, conversations=1000):
+    """BM25 history search at 100k stored messages: index upkeep per append and query latency"""
+    import sqlite3
+    from store import ConversationStore
+
+    rng = random.Random(0)
+    vocab = "the a to of and is in it you that for on with bedrock llama stream model token region".split()
+    vocab += [f"word{i}" for i in range(20000)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    texts = [" ".join(rng.choices(vocab, weights, k=60)) for _ in range(5000)]
+    ids = [ConversationStore.new_conversation_id() for _ in range(conversations)]
+    path = str(Path(tempfile.mkdtemp(prefix="search-bench-"), "conversations.sqlite3"))
+
+    # Seed the tables directly; opening the store then indexes the existing messages
+    ConversationStore(path)._db.close()
+    db = sqlite3.connect(path)
+    with db:
+        db.executemany("INSERT INTO conversations VALUES (?, ?, 0, 0, ?, ?)",
+                       ((cid, texts[i][:60], messages // conversations, "bench") for i, cid in enumerate(ids)))
+        db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+                       ((ids[i % conversations], i // conversations, "user" if i % 2 == 0 else "assistant",
+                         texts[i % len(texts)], float(i)) for i in range(messages)))
+    db.close()
+    started = time.perf_counter()
+    store = ConversationStore(path)
+    backfill_s = time.perf_counter() - started
+
+    appends = []
+    for i in range(500):
+        started = time.perf_counter()
+        store.append(ids[i % conversations], "user", texts[i])
+        appends.append(time.perf_counter() - started)
+
+    queries = ["word5", "word1500 word12", "the stream of tokens", "bedrock region word42", "word19999 llama"]
+    scopes = {"all": None, "conversation": ids[7]}
+    results = {"search_backfill_s": backfill_s, "search_append_p50_s": percentile(appends, 0.5)}
+    for scope, conversation_id in scopes.items():
+        latencies = []
+        for _ in range(20):
+            for query in queries:
+                started = time.perf_counter()
+                store.search(query, "bench", conversation_id)
+                latencies.append(time.perf_counter() - started)
+        results[f"search_{scope}_p50_s"] = percentile(latencies, 0.5)
+        results[f"search_{scope}_p99_s"] = percentile(latencies, 0.99)
+    return results
+
+
+SCENARIOS = {
+    "startup": bench_startup,
+    "import_time": bench_import_time,
+    "ask_llama3": bench_ask_llama3,
+    "ask_llama3_stream": bench_ask_llama3_stream,
+    "async_gather": bench_async_gather,
+    "llama3_script": bench_llama3_script,
+    "streamlit": bench_streamlit,
+    "connections": bench_connections,
+    "batch": bench_batch,
+    "api": bench_api,
+    "history_render": bench_history_render,
+    "prompt_build": bench_prompt_build,
+    "scheduler": bench_scheduler,
+    "redaction": bench_redaction,
+    "session_memory": bench_session_memory,
+    "search": bench_search,
+}
+
+
+def run_scenario(name, ctx):
+    """Run one scenario in this process and add its wall time and memory high-water mark"""
+    started = time.perf_counter()
+    try:
+        metrics = SCENARIOS[name](ctx)
+    except Exception as e:
+        metrics = {"error": f"{type(e).__name__}: {e}"}
+    metrics["wall_s"] = time.perf_counter() - started
+    metrics["rss_high_water_kb"] = max(peak_rss_kb(), max_rss_kb(resource.RUSAGE_CHILDREN))
+    return metrics
+
+
+def run_isolated(name, ctx, tmp):
+    """Run one scenario in a child interpreter; ru_maxrss is per process, so its peak is its own"""
+    result_path = Path(tmp, f"{name}.json")
+    command = [sys.executable, __file__, "--scenario", name, "--result-file", str(result_path),
+               "--requests", str(ctx["requests"]), "--concurrency", str(ctx["concurrency"])]
+    returncode = subprocess.run(command, cwd=ROOT, env=ctx["env"]).returncode
+    if returncode or not result_path.exists():
+        return {"error": f"scenario process exited with status {returncode}"}
+    with open(result_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of results against baseline"""
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            base = baseline.get(scenario, {}).get(name)
+            if not isinstance(value, (int, float)) or not base:
+                continue
+            higher_better = name.endswith(HIGHER_IS_BETTER)
+            change = (value - base) / base
+            if (-change if higher_better else change) > tolerance:
+                regressions.append(f"{scenario}.{name}: {base:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help="comma-separated scenarios to run")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--token-rate", type=float, default=400.0)
+    parser.add_argument("--output-tokens", type=int, default=128)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=str(BENCH_DIR / "results.json"))
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    # Used by the parent run to start each scenario in its own interpreter
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        ctx = {"env": dict(os.environ), "endpoint": os.environ["AWS_ENDPOINT_URL_BEDROCK_RUNTIME"],
+               "requests": args.requests, "concurrency": args.concurrency}
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(run_scenario(args.scenario, ctx), f, default=str)
+        return 0
+
+    server = fake_bedrock.serve(0, args.latency, args.token_rate, args.output_tokens,
+                                throttle_rate=args.throttle_rate, error_rate=args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    tmp = tempfile.mkdtemp(prefix="bedrock-bench-")
+
+    # Must be set before the app modules build their process-wide clients
+    env = {
+        **os.environ,
+        "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": endpoint,
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "BEDROCK_RPM": "1000000",
+        "BEDROCK_TPM": "1000000000",
+        "CONVERSATION_DB": str(Path(tmp, "conversations.sqlite3")),
+    }
+    env.pop("BEDROCK_ENDPOINTS", None)
+    env.pop("RESPONSE_CACHE_PATH", None)
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(ROOT)
+
+    ctx = {"env": env, "endpoint": endpoint, "requests": args.requests, "concurrency": args.concurrency}
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    results = {}
+    for name in names:
+        metrics = run_isolated(name, ctx, tmp)
+        results[name] = metrics
+        print(f"{name}: {json.dumps(metrics, default=str)}", flush=True)
+    server.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
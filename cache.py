@@ -0,0 +1,227 @@
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+from prompts import PROMPT_SUFFIX, USER_HEADER
+
+_WORD_RE = re.compile(r"\w+")
+_EMBED_DIM = 4096
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return " ".join(prompt.split()).casefold()
+
+
+def params_key(params: dict) -> str:
+    """Serialize model kwargs deterministically"""
+    return json.dumps(params or {}, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(prompt: str, params: dict) -> str:
+    """Exact-match key over the normalized prompt and the model kwargs"""
+    raw = normalize_prompt(prompt) + "\x00" + params_key(params)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def split_prompt(prompt: str):
+    """Split a framed Llama 3 prompt into (context, question).
+
+    The context is the system prompt and earlier turns and the question is
+    the final user turn. A prompt that is not framed is all question.
+    """
+    start = prompt.rfind(USER_HEADER)
+    if start < 0 or not prompt.endswith(PROMPT_SUFFIX):
+        return "", prompt
+    return prompt[:start], prompt[start + len(USER_HEADER):len(prompt) - len(PROMPT_SUFFIX)]
+
+
+def context_key(context: str) -> str:
+    return hashlib.sha256(normalize_prompt(context).encode("utf-8")).hexdigest()
+
+
+def hashed_embedding(text: str) -> dict:
+    """Cheap local embedding: L2-normalized hashed unigrams and bigrams"""
+    words = _WORD_RE.findall(text.casefold())
+    features = words + [a + " " + b for a, b in zip(words, words[1:])]
+    vector = {}
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest()
+        slot = int.from_bytes(digest, "little") % _EMBED_DIM
+        vector[slot] = vector.get(slot, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    if norm:
+        for slot in vector:
+            vector[slot] /= norm
+    return vector
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class ResponseCache:
+    """Two-tier answer cache: exact key lookup plus optional similarity lookup.
+
+    Entries live in a bounded in-memory LRU with a TTL. When ``path`` is set
+    they are also written to a SQLite file so several Streamlit worker
+    processes share the same answers. Similarity compares only the final
+    question of a framed prompt, and only between prompts whose system
+    prompt and history match exactly; the shared framing would otherwise
+    make unrelated questions look alike.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600.0, path=None,
+                 similarity_threshold=None, embed=hashed_embedding):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self._entries = OrderedDict()  # key -> (answer, created, params_key, context_key, vector)
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, prompt TEXT, params TEXT, answer TEXT, "
+                "created REAL, accessed REAL)"
+            )
+            self._db.commit()
+            self._load_recent()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key, prompt, params, answer, created):
+        context, vector = None, None
+        if self.similarity_threshold is not None:
+            context, question = split_prompt(prompt)
+            context, vector = context_key(context), self.embed(question)
+        self._entries[key] = (answer, created, params, context, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_recent(self):
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT key, prompt, params, answer, created FROM responses "
+            "ORDER BY accessed DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for key, prompt, params, answer, created in reversed(rows):
+            if not self._expired(created, now):
+                self._remember(key, prompt, params, answer, created)
+
+    def _get_disk(self, key, now):
+        row = self._db.execute(
+            "SELECT prompt, params, answer, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[3], now):
+            return None
+        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self._remember(key, row[0], row[1], row[2], row[3])
+        return row[2]
+
+    def _get_similar(self, prompt, params, now):
+        context, question = split_prompt(prompt)
+        context = context_key(context)
+        query = self.embed(question)
+        best_key, best_score = None, self.similarity_threshold
+        for key, (_, created, entry_params, entry_context, vector) in self._entries.items():
+            if entry_params != params or entry_context != context or vector is None or self._expired(created, now):
+                continue
+            score = _cosine(query, vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][0]
+
+    def _count(self, outcome):
+        self.stats[outcome] += 1
+        METRICS.incr(f"response_cache_{outcome}_total")
+
+    def get(self, prompt: str, params: dict):
+        """Return a cached answer or None"""
+        key = cache_key(prompt, params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._entries.move_to_end(key)
+                    self._count("exact_hits")
+                    return entry[0]
+                del self._entries[key]
+            if self._db is not None:
+                answer = self._get_disk(key, now)
+                if answer is not None:
+                    self._count("disk_hits")
+                    return answer
+            if self.similarity_threshold is not None:
+                answer = self._get_similar(prompt, params_key(params), now)
+                if answer is not None:
+                    self._count("similar_hits")
+                    return answer
+            self._count("misses")
+            return None
+
+    def age(self, prompt: str, params: dict):
+        """Seconds since the exact-match entry was stored, or None if absent/expired"""
+        key = cache_key(prompt, params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created = entry[1]
+            elif self._db is not None:
+                row = self._db.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+                created = row[0] if row else None
+            else:
+                created = None
+        if created is None or self._expired(created, now):
+            return None
+        return now - created
+
+    def put(self, prompt: str, params: dict, answer: str):
+        """Store an answer in memory and, if configured, on disk"""
+        key = cache_key(prompt, params)
+        serialized = params_key(params)
+        now = time.time()
+        with self._lock:
+            self._remember(key, prompt, serialized, answer, now)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, prompt, serialized, answer, now, now),
+            )
+            if self.ttl is not None:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
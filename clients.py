@@ -0,0 +1,58 @@
+import os
+import threading
+
+from botocore.config import Config
+
+from metrics import instrument_client
+from prompts import MODEL_KWARGS
+
+MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "meta.llama3-70b-instruct-v1:0")
+
+# Connection pool sized for many concurrent Streamlit sessions, kept alive
+# between calls so reruns do not pay for a fresh TLS handshake. Retries are
+# left to ratelimit.GUARD so they share the process-wide rate budget.
+BEDROCK_CONFIG = Config(
+    max_pool_connections=int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "50")),
+    retries={"max_attempts": 1, "mode": "standard"},
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=120,
+)
+
+_lock = threading.Lock()
+_clients = {}
+_llms = {}
+
+
+def get_bedrock_client(region_name=None):
+    """Return the process-wide bedrock-runtime client, creating it on first use"""
+    client = _clients.get(region_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(region_name)
+            if client is None:
+                # boto3 is imported on first use to keep it off the startup path
+                import boto3
+
+                client = instrument_client(boto3.client(
+                    "bedrock-runtime", region_name=region_name, config=BEDROCK_CONFIG
+                ))
+                _clients[region_name] = client
+    return client
+
+
+def get_llm(model_id=MODEL_ID, region_name=None):
+    """Return the process-wide BedrockLLM for a model, creating it on first use"""
+    key = (model_id, region_name)
+    llm = _llms.get(key)
+    if llm is None:
+        client = get_bedrock_client(region_name)
+        with _lock:
+            llm = _llms.get(key)
+            if llm is None:
+                # LangChain is only loaded by callers that actually use it
+                from langchain_aws import BedrockLLM
+
+                llm = BedrockLLM(client=client, model_id=model_id, model_kwargs=dict(MODEL_KWARGS))
+                _llms[key] = llm
+    return llm
@@ -0,0 +1,173 @@
+"""The question-answering path shared by the Streamlit app and the HTTP API."""
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from cache import ResponseCache, cache_key
+from clients import MODEL_KWARGS, get_bedrock_client, get_llm
+from memory import build_chat_prompt
+from metrics import record_stream
+from prompts import build_body
+from ratelimit import GUARD, request_tokens
+from redact import redact, redact_stream
+from router import ROUTER
+from scheduler import BACKGROUND, INTERACTIVE, SCHEDULER
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Call invoke_model directly instead of going through LangChain's BedrockLLM
+BEDROCK_DIRECT = os.environ.get("BEDROCK_DIRECT", "0") == "1"
+
+_similarity = os.environ.get("RESPONSE_CACHE_SIMILARITY")
+
+# One response cache per process, shared by every session
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+    path=os.environ.get("RESPONSE_CACHE_PATH") or None,
+    similarity_threshold=float(_similarity) if _similarity else None,
+)
+
+# Process-wide registry of in-flight generations
+IN_FLIGHT = SingleFlight()
+
+
+def warm_up(include_llm=True):
+    """Build the Bedrock client (and LLM, unless bypassed) ahead of the first question"""
+    try:
+        get_bedrock_client()
+        if include_llm and not BEDROCK_DIRECT:
+            get_llm()
+    except Exception:
+        logger.warning("Bedrock warm-up failed; clients will be built on first use", exc_info=True)
+
+
+def invoke_direct(endpoint, prompt: str) -> str:
+    """Single invoke_model call without LangChain, as in llama3.py"""
+    response = get_bedrock_client(endpoint.region).invoke_model(
+        body=build_body(prompt, MODEL_KWARGS),
+        modelId=endpoint.model_id,
+        accept="application/json",
+        contentType="application/json",
+    )
+    return json.loads(response["body"].read())["generation"]
+
+
+def invoke_langchain(endpoint, prompt: str) -> str:
+    return get_llm(endpoint.model_id, endpoint.region).invoke(prompt)
+
+
+def chat_prompt(question: str, history=()) -> str:
+    """Build the prompt with sensitive entities masked before it leaves the process"""
+    # Earlier turns are packed into the prompt within the input-token budget
+    return redact(build_chat_prompt(history, question))
+
+
+def generate_answer(prompt: str, session=None, priority=INTERACTIVE, on_wait=None, invoke=None) -> str:
+    """Generate and cache an answer for a full prompt, bypassing the cache lookup"""
+    invoke = invoke or (invoke_direct if BEDROCK_DIRECT else invoke_langchain)
+    tokens = request_tokens(prompt, MODEL_KWARGS)
+    # Wait for a fair share of upstream capacity before touching the rate limits
+    with SCHEDULER.slot(session, tokens, priority, on_wait):
+        # The router picks the fastest healthy (region, model) and fails over silently
+        answer = redact(GUARD.call(
+            lambda: ROUTER.invoke(lambda ep: invoke(ep, prompt), prompt),
+            tokens,
+        ))
+    RESPONSE_CACHE.put(prompt, MODEL_KWARGS, answer)
+    return answer
+
+
+def ask_llama3(question: str, history=(), session=None, priority=INTERACTIVE, on_wait=None) -> str:
+    prompt = chat_prompt(question, history)
+    cached = RESPONSE_CACHE.get(prompt, MODEL_KWARGS)
+    if cached is not None:
+        return cached
+    # Identical questions already being answered share that call
+    return IN_FLIGHT.do(
+        cache_key(prompt, MODEL_KWARGS), lambda: generate_answer(prompt, session, priority, on_wait)
+    )
+
+
+def refresh_answer(question: str) -> str:
+    """Regenerate the cached answer to a standalone question (used by the prefetcher)"""
+    prompt = chat_prompt(question)
+    # Always the direct path, so background work never loads LangChain
+    return IN_FLIGHT.do(
+        cache_key(prompt, MODEL_KWARGS),
+        lambda: generate_answer(prompt, "prefetch", BACKGROUND, invoke=invoke_direct),
+    )
+
+
+def answer_age(question: str):
+    """Age in seconds of the cached answer to a standalone question, or None"""
+    return RESPONSE_CACHE.age(chat_prompt(question), MODEL_KWARGS)
+
+
+def stream_generation(prompt: str):
+    """Yield generation chunks straight from invoke_model_with_response_stream"""
+    body = build_body(prompt, MODEL_KWARGS)
+    started = time.perf_counter()
+    response = GUARD.call(
+        lambda: ROUTER.invoke(
+            lambda ep: get_bedrock_client(ep.region).invoke_model_with_response_stream(
+                body=body,
+                modelId=ep.model_id,
+                accept="application/json",
+                contentType="application/json",
+            ),
+            prompt,
+            streaming=True,
+        ),
+        request_tokens(prompt, MODEL_KWARGS),
+    )
+    invocation_metrics = None
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        payload = json.loads(chunk["bytes"])
+        invocation_metrics = payload.get("amazon-bedrock-invocationMetrics", invocation_metrics)
+        text = payload.get("generation")
+        if text:
+            yield text
+    record_stream(time.perf_counter() - started, invocation_metrics)
+
+
+def ask_llama3_stream(question: str, history=(), session=None, priority=INTERACTIVE, on_wait=None):
+    """Yield the answer text chunk by chunk as Bedrock generates it"""
+    prompt = chat_prompt(question, history)
+    cached = RESPONSE_CACHE.get(prompt, MODEL_KWARGS)
+    if cached is not None:
+        yield cached
+        return
+
+    tokens = request_tokens(prompt, MODEL_KWARGS)
+    # Queue positions reported by the pump thread, shown from the caller's thread
+    positions = deque()
+
+    def generate():
+        # The generation, not its subscribers, holds the slot: it runs to the
+        # end to fill the cache even if everyone listening has gone
+        with SCHEDULER.slot(session, tokens, priority, positions.append if on_wait else None):
+            parts = []
+            # Masking holds back only the tail a match could still be spanning
+            for text in redact_stream(stream_generation(prompt)):
+                parts.append(text)
+                yield text
+        RESPONSE_CACHE.put(prompt, MODEL_KWARGS, "".join(parts))
+
+    def show_position():
+        while positions:
+            on_wait(positions.popleft())
+
+    # Identical questions already streaming subscribe to the same generation
+    # and cost nothing upstream
+    chunks = IN_FLIGHT.stream(cache_key(prompt, MODEL_KWARGS), generate, show_position if on_wait else None)
+    for text in chunks:
+        if on_wait is not None:
+            show_position()
+        yield text
@@ -1,5 +1,7 @@
 import boto3
 import json
+from prompts import MODEL_KWARGS, build_body, build_prompt
+from ratelimit import GUARD, request_tokens
 
 prompt_data = """
 Act as a Shakespeare and write a poem on Generative AI
@@ -7,24 +9,22 @@ Act as a Shakespeare and write a poem on Generative AI
 
 bedrock = boto3.client(service_name="bedrock-runtime")
 
-# Updated prompt format for Llama 3
-payload = {
-    "prompt": f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{prompt_data}<|end_header_id|>\n\n<|start_header_id|>assistant<|end_header_id|>\n\n",
-    "max_gen_len": 512,
-    "temperature": 0.5,
-    "top_p": 0.9
-}
-
-body = json.dumps(payload)
+# Llama 3 prompt without a system turn
+prompt = build_prompt(prompt_data.strip(), system=None)
+body = build_body(prompt)
 
 # Updated model ID for Llama 3
 model_id = "meta.llama3-70b-instruct-v1:0"
 
-response = bedrock.invoke_model(
-    body=body,
-    modelId=model_id,
-    accept="application/json",
-    contentType="application/json"
+# Throttles are retried with backoff under the shared rate limits
+response = GUARD.call(
+    lambda: bedrock.invoke_model(
+        body=body,
+        modelId=model_id,
+        accept="application/json",
+        contentType="application/json"
+    ),
+    request_tokens(prompt, MODEL_KWARGS),
 )
 
 response_body = json.loads(response.get("body").read())
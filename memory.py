@@ -0,0 +1,285 @@
+import math
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from prompts import SYSTEM_PROMPT, build_prompt
+
+# Llama 3 70B has an 8k context; leave room for max_gen_len
+MAX_INPUT_TOKENS = int(os.environ.get("MAX_INPUT_TOKENS", "6000"))
+SUMMARY_TOKENS = 200
+SUMMARY_PREFIX = "Earlier in this conversation the user asked about: "
+TRUNCATION_MARK = "\n[...]\n"
+MAX_SESSION_MESSAGES = int(os.environ.get("MAX_SESSION_MESSAGES", "200"))
+
+# Header and end-of-turn special tokens added around every turn
+TURN_OVERHEAD_TOKENS = 5
+
+# Turns at the end of a history that stay uncompressed, and the shortest content worth compressing
+RECENT_MESSAGES = 6
+COMPRESS_MIN_CHARS = 512
+
+# Chat history held in memory across all sessions, and how long an idle session keeps its copy
+SESSION_MEMORY_BUDGET = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "1800"))
+
+
+class Message:
+    """One chat turn in a fraction of the memory of a dict.
+
+    The role is interned, the timestamp is whole epoch seconds, and long
+    content is zlib-compressed in place once the turn is no longer recent.
+    Supports ``message["content"]`` so it is interchangeable with the dict
+    messages the API receives.
+    """
+
+    __slots__ = ("role", "ts", "_text", "_blob")
+
+    def __init__(self, role, content, ts=None):
+        self.role = sys.intern(role)
+        self.ts = int(time.time() if ts is None else ts)
+        self._text = content
+        self._blob = None
+
+    @property
+    def content(self) -> str:
+        if self._text is not None:
+            return self._text
+        return zlib.decompress(self._blob).decode("utf-8")
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.ts).strftime("%H:%M:%S")
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def compress(self):
+        """Keep the content compressed from now on, if that saves memory"""
+        if self._text is None or len(self._text) < COMPRESS_MIN_CHARS:
+            return
+        blob = zlib.compress(self._text.encode("utf-8"))
+        if len(blob) < sys.getsizeof(self._text):
+            self._text, self._blob = None, blob
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self._text if self._text is not None else self._blob)
+
+
+def compact_messages(messages, recent=RECENT_MESSAGES):
+    """Compress the content of every turn except the most recent ones"""
+    for message in messages[:max(0, len(messages) - recent)]:
+        message.compress()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Llama 3 token count (about four characters per token)"""
+    return math.ceil(len(text) / 4)
+
+
+def turn_tokens(text: str) -> int:
+    return estimate_tokens(text) + TURN_OVERHEAD_TOKENS
+
+
+def summarize_turns(messages, max_tokens=SUMMARY_TOKENS) -> str:
+    """Compact extractive summary of dropped turns: the questions the user asked"""
+    budget = max_tokens * 4 - len(SUMMARY_PREFIX)
+    topics = []
+    for message in reversed(messages):
+        if message["role"] != "user":
+            continue
+        topic = " ".join(message["content"].split())[:120]
+        if len(topic) + 2 > budget:
+            break
+        topics.append(topic)
+        budget -= len(topic) + 2
+    if not topics:
+        return ""
+    return SUMMARY_PREFIX + "; ".join(reversed(topics))
+
+
+def fit_question(question, system=SYSTEM_PROMPT, max_input_tokens=MAX_INPUT_TOKENS,
+                 summary_tokens=SUMMARY_TOKENS) -> str:
+    """Shorten a question that would leave no room for a history summary, keeping its start and end"""
+    budget = max_input_tokens - turn_tokens(system) - 2 * TURN_OVERHEAD_TOKENS - summary_tokens
+    keep = max(0, budget * 4 - len(TRUNCATION_MARK))
+    if len(question) <= keep + len(TRUNCATION_MARK):
+        return question
+    head = keep // 2
+    return question[:head] + TRUNCATION_MARK + question[len(question) - (keep - head):]
+
+
+def pack_history(history, question, system=SYSTEM_PROMPT,
+                 max_input_tokens=MAX_INPUT_TOKENS, summary_tokens=SUMMARY_TOKENS):
+    """Pick the most recent turns that fit the input-token budget.
+
+    Returns ``(summary, kept)`` where ``kept`` is the tail of ``history`` that
+    fits and ``summary`` briefly describes the turns that were dropped.
+    """
+    budget = max_input_tokens - turn_tokens(system) - turn_tokens(question) - TURN_OVERHEAD_TOKENS
+    costs = [turn_tokens(message["content"]) for message in history]
+    if sum(costs) <= budget:
+        return "", list(history)
+
+    budget -= summary_tokens
+    start = len(history)
+    while start > 0 and costs[start - 1] <= budget:
+        start -= 1
+        budget -= costs[start]
+    # Never open the packed context on a dangling assistant reply
+    while start < len(history) and history[start]["role"] != "user":
+        start += 1
+    return summarize_turns(history[:start], summary_tokens), list(history[start:])
+
+
+def build_chat_prompt(history, question, system=SYSTEM_PROMPT, max_input_tokens=MAX_INPUT_TOKENS):
+    """Assemble a multi-turn Llama 3 chat prompt that stays inside the token budget"""
+    question = fit_question(question, system, max_input_tokens)
+    summary, kept = pack_history(history, question, system, max_input_tokens)
+    if summary:
+        system = f"{system}\n\n{summary}"
+    return build_prompt(question, system, kept)
+
+
+def spill_messages(messages, max_messages=MAX_SESSION_MESSAGES) -> int:
+    """Drop the oldest half of an over-long history from memory.
+
+    The conversation store keeps every message, so the dropped ones are read
+    back from there when they are needed. Returns how many messages were
+    removed from the front of ``messages``.
+    """
+    if len(messages) <= max_messages:
+        return 0
+    count = len(messages) - max_messages // 2
+    del messages[:count]
+    return count
+
+
+def history_nbytes(messages, fragments=()) -> int:
+    """Approximate memory held by one session's history and rendered HTML"""
+    total = sys.getsizeof(messages) + sys.getsizeof(fragments)
+    for message in messages:
+        if isinstance(message, Message):
+            total += message.nbytes()
+        else:
+            total += sys.getsizeof(message) + sum(sys.getsizeof(v) for v in message.values())
+    total += sum(sys.getsizeof(fragment) for fragment in fragments if fragment is not None)
+    return total
+
+
+class _Session:
+    def __init__(self):
+        self.lists = ()
+        self.nbytes = 0
+        self.last_active = 0.0
+        # Script runs in progress; a running session is never evicted
+        self.running = 0
+
+
+class SessionRegistry:
+    """Memory accounting for the chat history of every session in the process.
+
+    Each script run reports its session's lists. Sessions idle for longer
+    than ``idle_seconds`` have their in-memory history dropped, and so do the
+    least recently active sessions while the total is over ``budget`` bytes.
+    A session whose script is running is skipped, so its lists are never
+    cleared under it. Conversations are persisted, so an evicted session
+    reloads its history from the store on its next run.
+    """
+
+    def __init__(self, budget=SESSION_MEMORY_BUDGET, idle_seconds=SESSION_IDLE_SECONDS,
+                 min_idle_seconds=60.0, sweep_interval=30.0):
+        self.budget = budget
+        self.idle_seconds = idle_seconds
+        # Sessions active more recently than this are never evicted, even over budget
+        self.min_idle_seconds = min_idle_seconds
+        self.sweep_interval = sweep_interval
+        self.stats = {"evicted_sessions": 0, "evicted_bytes": 0}
+        self._sessions = {}
+        # Evicted session -> when; forgotten after a day if the session never returns
+        self._evicted = {}
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def running(self, session_id):
+        """Keep the session from being evicted while one of its script runs is in progress"""
+        with self._lock:
+            session = self._session(session_id)
+            session.running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                session.running -= 1
+                session.last_active = time.time()
+
+    def touch(self, session_id, messages, fragments) -> int:
+        """Record a session's current history and return its size in bytes"""
+        nbytes = history_nbytes(messages, fragments)
+        now = time.time()
+        with self._lock:
+            session = self._session(session_id)
+            session.lists = (messages, fragments)
+            session.nbytes = nbytes
+            session.last_active = now
+            if now - self._last_sweep >= self.sweep_interval or self._total() > self.budget:
+                self._last_sweep = now
+                self._reclaim(now)
+        return nbytes
+
+    def take_evicted(self, session_id) -> bool:
+        """Whether the session's history was dropped since its last run (clears the flag)"""
+        with self._lock:
+            return self._evicted.pop(session_id, None) is not None
+
+    def usage(self, session_id) -> int:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.nbytes if session else 0
+
+    def total(self):
+        """(bytes, sessions) held in memory across the process"""
+        with self._lock:
+            return self._total(), len(self._sessions)
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        return session
+
+    def _total(self):
+        return sum(session.nbytes for session in self._sessions.values())
+
+    def _evict(self, session_id):
+        session = self._sessions.pop(session_id)
+        for values in session.lists:
+            values.clear()
+        self._evicted[session_id] = time.time()
+        self.stats["evicted_sessions"] += 1
+        self.stats["evicted_bytes"] += session.nbytes
+
+    def _reclaim(self, now):
+        for session_id, evicted in list(self._evicted.items()):
+            if now - evicted >= 86400:
+                del self._evicted[session_id]
+        for session_id, session in list(self._sessions.items()):
+            if not session.running and now - session.last_active >= self.idle_seconds:
+                self._evict(session_id)
+        total = self._total()
+        for session_id, session in sorted(self._sessions.items(), key=lambda item: item[1].last_active):
+            if total <= self.budget or now - session.last_active < self.min_idle_seconds:
+                break
+            if session.running:
+                continue
+            total -= session.nbytes
+            self._evict(session_id)
+
+
+# Shared by every Streamlit session in this process
+SESSIONS = SessionRegistry()
@@ -0,0 +1,198 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("bedrock.metrics")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Sliding window of samples with percentile lookup"""
+
+    def __init__(self, window=2048):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    """In-process latency, token and error accounting for Bedrock calls.
+
+    Every recorded event is also passed to the registered sinks, which are
+    plain callables taking one dict.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.sinks = []
+        self.started = time.time()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def record(self, event):
+        """Fold one call event into the counters/histograms and emit it"""
+        operation = event["operation"]
+        self.incr(f"{operation}_requests_total")
+        if event.get("error"):
+            self.incr(f"{operation}_errors_total")
+        if event.get("throttled"):
+            self.incr("throttles_total")
+        if event.get("retries"):
+            self.incr("retries_total", event["retries"])
+        if event.get("input_tokens"):
+            self.incr("input_tokens_total", event["input_tokens"])
+        if event.get("output_tokens"):
+            self.incr("output_tokens_total", event["output_tokens"])
+            if event.get("latency"):
+                self.observe("output_tokens_per_second", event["output_tokens"] / event["latency"])
+        if event.get("latency") is not None:
+            self.observe(f"{operation}_latency_seconds", event["latency"])
+        if event.get("ttft") is not None:
+            self.observe("time_to_first_token_seconds", event["ttft"])
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception:
+                logger.exception("metrics sink failed")
+
+    def snapshot(self):
+        """Return counters plus count/sum/quantiles for every histogram"""
+        with self._lock:
+            data = {"counters": dict(self.counters), "histograms": {}}
+            for name, histogram in self.histograms.items():
+                entry = {"count": histogram.count, "sum": histogram.total}
+                for q in QUANTILES:
+                    entry[f"p{int(q * 100)}"] = histogram.percentile(q)
+                data["histograms"][name] = entry
+        return data
+
+
+METRICS = Metrics()
+
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    return int(value) if value and value.isdigit() else None
+
+
+def instrument_client(client, metrics=METRICS):
+    """Record latency, tokens, retries and throttling for every call on a botocore client"""
+
+    def before_call(context, **kwargs):
+        context["metrics_started"] = time.perf_counter()
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        started = context.get("metrics_started")
+        latency = time.perf_counter() - started if started is not None else None
+        headers = http_response.headers
+        error = parsed.get("Error", {}).get("Code")
+        event = {
+            "operation": model.name,
+            "latency": latency,
+            "status": http_response.status_code,
+            "retries": parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+            "error": error,
+            "throttled": error in ("ThrottlingException", "TooManyRequestsException"),
+        }
+        if model.name == "InvokeModelWithResponseStream":
+            # Headers arrive with the first chunk; the stream records totals itself
+            event["ttft"] = latency
+        else:
+            event["input_tokens"] = _header_int(headers, "x-amzn-bedrock-input-token-count")
+            event["output_tokens"] = _header_int(headers, "x-amzn-bedrock-output-token-count")
+        metrics.record(event)
+
+    client.meta.events.register("before-call.bedrock-runtime", before_call)
+    client.meta.events.register("after-call.bedrock-runtime", after_call)
+    return client
+
+
+def record_stream(elapsed, invocation_metrics, metrics=METRICS):
+    """Record a finished response stream from its amazon-bedrock-invocationMetrics"""
+    invocation_metrics = invocation_metrics or {}
+    metrics.record({
+        "operation": "ResponseStream",
+        "latency": elapsed,
+        "input_tokens": invocation_metrics.get("inputTokenCount"),
+        "output_tokens": invocation_metrics.get("outputTokenCount"),
+    })
+
+
+def _metric_name(prefix, name):
+    return f"{prefix}_" + re.sub(r"(?<=[a-z])(?=[A-Z])", "_", name).lower()
+
+
+def render_prometheus(metrics=METRICS, prefix="bedrock"):
+    """Render a snapshot in the Prometheus text exposition format"""
+    snapshot = metrics.snapshot()
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(prefix, name)
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, entry in sorted(snapshot["histograms"].items()):
+        metric = _metric_name(prefix, name)
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            value = entry[f"p{int(q * 100)}"]
+            if value is not None:
+                lines.append(f'{metric}{{quantile="{q}"}} {value}')
+        lines += [f"{metric}_count {entry['count']}", f"{metric}_sum {entry['sum']}"]
+    return "\n".join(lines) + "\n"
+
+
+def json_log_sink(event):
+    """Sink that writes each call event as one JSON log line"""
+    logger.info(json.dumps({"ts": time.time(), **event}, default=str))
+
+
+def start_prometheus_server(port, metrics=METRICS):
+    """Serve /metrics on a daemon thread and return the server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            payload = render_prometheus(metrics).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
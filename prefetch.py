@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUGGESTIONS = [
+    "Explain the concept of artificial intelligence in simple terms.",
+    "What is generative AI and how does it differ from traditional machine learning?",
+    "How does Amazon Bedrock keep my prompts and data secure?",
+    "What are large language models good at, and where do they struggle?",
+    "Give me three practical tips for writing better prompts.",
+]
+
+
+def load_catalog(path=None):
+    """Suggested questions from a JSON list file, or the built-in defaults if it is unusable"""
+    path = path or os.environ.get("SUGGESTIONS_FILE")
+    if not path:
+        return list(DEFAULT_SUGGESTIONS)
+    try:
+        with open(path, encoding="utf-8") as f:
+            questions = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Using the default suggestions: cannot read %s: %s", path, e)
+        return list(DEFAULT_SUGGESTIONS)
+    if not questions or not isinstance(questions, list) or not all(
+            isinstance(q, str) and q.strip() for q in questions):
+        logger.warning("Using the default suggestions: %s is not a non-empty JSON list of questions", path)
+        return list(DEFAULT_SUGGESTIONS)
+    return questions
+
+
+class Prefetcher:
+    """Keep answers to suggested questions warm in the response cache.
+
+    Every suggestion is computed once at start-up. After that an entry is
+    regenerated only when it is older than ``staleness`` seconds and someone
+    asked it since the last refresh, so unused suggestions are left to expire.
+    At most ``max_calls_per_hour`` upstream calls are spent on prefetching.
+    """
+
+    def __init__(self, questions, interval=300.0, staleness=1800.0, max_calls_per_hour=60):
+        self.questions = list(questions)
+        self.interval = interval
+        self.staleness = staleness
+        self.max_calls_per_hour = max_calls_per_hour
+        self.stats = {"refreshed": 0, "skipped_budget": 0, "failed": 0}
+        self._used = set()
+        self._warmed = set()
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def mark_used(self, question):
+        with self._lock:
+            self._used.add(question)
+
+    def _spend(self):
+        """Take one call from the hourly budget, or return False if it is spent"""
+        now = time.monotonic()
+        while self._calls and now - self._calls[0] > 3600:
+            self._calls.popleft()
+        if len(self._calls) >= self.max_calls_per_hour:
+            return False
+        self._calls.append(now)
+        return True
+
+    def due(self, age):
+        """Questions whose cached answer should be (re)generated now"""
+        with self._lock:
+            used, warmed = set(self._used), set(self._warmed)
+        due = []
+        for question in self.questions:
+            if question not in warmed:
+                due.append(question)
+            elif question in used:
+                current = age(question)
+                if current is None or current > self.staleness:
+                    due.append(question)
+        return due
+
+    def run_once(self, refresh, age):
+        """Refresh every due suggestion that fits in the budget"""
+        for question in self.due(age):
+            if not self._spend():
+                self.stats["skipped_budget"] += 1
+                continue
+            try:
+                refresh(question)
+            except Exception:
+                logger.warning("Prefetching an answer for %r failed", question, exc_info=True)
+                self.stats["failed"] += 1
+                continue
+            with self._lock:
+                self._used.discard(question)
+                self._warmed.add(question)
+            self.stats["refreshed"] += 1
+
+    def start(self, refresh, age):
+        """Run the refresh loop on a daemon thread (once per process)"""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+
+            def loop():
+                while True:
+                    self.run_once(refresh, age)
+                    time.sleep(self.interval)
+
+            self._thread = threading.Thread(target=loop, name="suggestion-prefetch", daemon=True)
+            self._thread.start()
+            return self._thread
+
+
+PREFETCHER = Prefetcher(
+    load_catalog(),
+    interval=float(os.environ.get("PREFETCH_INTERVAL", "300")),
+    staleness=float(os.environ.get("PREFETCH_STALENESS", "1800")),
+    max_calls_per_hour=int(os.environ.get("PREFETCH_MAX_CALLS_PER_HOUR", "60")),
+)
@@ -0,0 +1,86 @@
+"""Llama 3 prompt construction shared by the app, the scripts and batch jobs.
+
+Turn framing follows the Llama 3 instruct format: every turn opens with
+``<|start_header_id|>role<|end_header_id|>`` plus a blank line and closes
+with ``<|eot_id|>``; the prompt ends on an open assistant header.
+"""
+import json
+from functools import lru_cache
+
+SYSTEM_PROMPT = "You are a very intelligent bot with exceptional critical thinking."
+
+BEGIN_OF_TEXT = "<|begin_of_text|>"
+EOT = "<|eot_id|>"
+SYSTEM_HEADER = "<|start_header_id|>system<|end_header_id|>\n\n"
+USER_HEADER = "<|start_header_id|>user<|end_header_id|>\n\n"
+ASSISTANT_HEADER = "<|start_header_id|>assistant<|end_header_id|>\n\n"
+
+HEADERS = {"system": SYSTEM_HEADER, "user": USER_HEADER, "assistant": ASSISTANT_HEADER}
+
+# Generation parameters shared by every Bedrock call path
+MODEL_KWARGS = {
+    "max_gen_len": 512,
+    "temperature": 0.5,
+    "top_p": 0.9,
+    # you can add more params here as needed
+}
+
+
+@lru_cache(maxsize=32)
+def prompt_prefix(system=SYSTEM_PROMPT) -> str:
+    """Everything before the user's text in a single-turn prompt"""
+    if system is None:
+        return BEGIN_OF_TEXT + USER_HEADER
+    return BEGIN_OF_TEXT + SYSTEM_HEADER + system + EOT + USER_HEADER
+
+
+PROMPT_SUFFIX = EOT + ASSISTANT_HEADER
+
+
+def build_prompt(question: str, system=SYSTEM_PROMPT, history=()) -> str:
+    """Frame a question, optionally after earlier turns, as a Llama 3 prompt"""
+    if not history:
+        return "".join((prompt_prefix(system), question, PROMPT_SUFFIX))
+    parts = [BEGIN_OF_TEXT]
+    if system is not None:
+        parts += (SYSTEM_HEADER, system, EOT)
+    for message in history:
+        role = "user" if message["role"] == "user" else "assistant"
+        parts += (HEADERS[role], message["content"], EOT)
+    parts += (USER_HEADER, question, PROMPT_SUFFIX)
+    return "".join(parts)
+
+
+# LangChain PromptTemplate source for single-question chains
+QUESTION_TEMPLATE = prompt_prefix().replace("{", "{{").replace("}", "}}") + "{question}" + PROMPT_SUFFIX
+
+
+@lru_cache(maxsize=32)
+def _params_tail(params) -> str:
+    return "".join(f",{json.dumps(key)}:{json.dumps(value)}" for key, value in params) + "}"
+
+
+def build_body(prompt: str, params=None) -> str:
+    """Serialize an invoke_model body; the parameter tail is encoded once and reused"""
+    params = MODEL_KWARGS if params is None else params
+    return '{"prompt":' + json.dumps(prompt) + _params_tail(tuple(params.items()))
+
+
+def render_many(questions, system=SYSTEM_PROMPT, params=None):
+    """Yield invoke_model bodies for many questions sharing one system prompt"""
+    prefix = json.dumps(prompt_prefix(system))[:-1]
+    suffix = json.dumps(PROMPT_SUFFIX)[1:]
+    params = MODEL_KWARGS if params is None else params
+    tail = _params_tail(tuple(params.items()))
+    for question in questions:
+        yield '{"prompt":' + prefix + json.dumps(question)[1:-1] + suffix + tail
+
+
+def build_record(body: str, model_id: str) -> dict:
+    """Wrap a body in the invoke_model request record used by test.json and batch.py"""
+    return {
+        "modelId": model_id,
+        "contentType": "application/json",
+        "accept": "application/json",
+        "body": body,
+    }
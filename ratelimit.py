@@ -0,0 +1,211 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+from memory import estimate_tokens
+from metrics import METRICS
+
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+# HTTPClientError stands for a read timeout or a connection dropped mid-request
+TRANSIENT_CODES = {"ServiceUnavailableException", "InternalServerException", "ModelNotReadyException",
+                   "HTTPClientError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Bedrock while the circuit breaker is open"""
+
+
+def request_tokens(prompt: str, params: dict) -> int:
+    """Pre-flight estimate of the tokens a request can consume"""
+    return estimate_tokens(prompt) + params.get("max_gen_len", 0)
+
+
+def error_code(exc):
+    """Find the Bedrock error code behind an exception, even when LangChain re-raised it"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, ClientError):
+            return exc.response.get("Error", {}).get("Code")
+        if isinstance(exc, BotocoreConnectionError):
+            return "ConnectionError"
+        if isinstance(exc, HTTPClientError):
+            return "HTTPClientError"
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off on throttling and recovers on success.
+
+    reserve() takes tokens immediately and returns how long the caller must
+    wait for them, so the same bucket serves both threads and coroutines.
+    """
+
+    def __init__(self, per_minute, min_fraction=0.1):
+        self.max_rate = per_minute / 60.0
+        self.min_rate = self.max_rate * min_fraction
+        self.rate = self.max_rate
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1.0):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.7)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.02)
+
+
+class CircuitBreaker:
+    """Stop calling Bedrock after repeated failures, then probe again after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpenError("Bedrock is temporarily unavailable, please retry shortly")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """End a request that says nothing about the service's health, such as a throttled one"""
+        with self._lock:
+            self._probing = False
+
+
+class BedrockGuard:
+    """Rate limiting, jittered exponential backoff and a circuit breaker around Bedrock calls.
+
+    One instance is shared by every caller in the process so the requests-
+    and tokens-per-minute budgets reflect the account quota, not a per-session
+    guess. ``tokens`` is the caller's estimate of input plus output tokens.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_attempts=5,
+                 base_delay=0.5, max_delay=20.0, breaker=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+    def _admit(self, tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _outcome(self, exc, attempt):
+        """Handle a failed attempt and return the backoff delay, or None to give up.
+
+        The breaker counts requests, not attempts, and only those that end in
+        a 5xx or connection error: throttling already slows the buckets, and
+        counting it would turn a burst of throttles into an outage.
+        """
+        code = error_code(exc)
+        throttled = code in THROTTLE_CODES
+        if throttled:
+            self.requests.throttled()
+            self.tokens.throttled()
+        elif code not in TRANSIENT_CODES and code != "ConnectionError":
+            # Bedrock answered, so the service itself is healthy
+            self.breaker.record_success()
+            return None
+        if attempt == self.max_attempts - 1:
+            if throttled:
+                self.breaker.record_neutral()
+            else:
+                self.breaker.record_failure()
+            return None
+        METRICS.incr("retries_total")
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        self.requests.succeeded()
+        self.tokens.succeeded()
+
+    def call(self, fn, tokens=1):
+        """Call fn() under the rate limits, retrying throttles and transient errors"""
+        self.breaker.allow()
+        for attempt in range(self.max_attempts):
+            time.sleep(self._admit(tokens))
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._outcome(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._succeeded()
+            return result
+
+    async def acall(self, fn, tokens=1):
+        """Async variant of call() for coroutine functions"""
+        self.breaker.allow()
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._admit(tokens))
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._outcome(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded()
+            return result
+
+
+# Shared by the app, batch runner, async client and scripts in this process
+GUARD = BedrockGuard(
+    requests_per_minute=int(os.environ.get("BEDROCK_RPM", "400")),
+    tokens_per_minute=int(os.environ.get("BEDROCK_TPM", "300000")),
+)
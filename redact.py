@@ -0,0 +1,225 @@
+"""Local stand-in for Bedrock Guardrails' sensitive-information filters.
+
+Text is masked in place with the entity name, as Guardrails does in
+ANONYMIZE mode: "mail me at jane@example.com" -> "mail me at {EMAIL}".
+Built-in patterns are compiled into one alternation so the text is scanned
+once, and the custom deny-list is matched in one pass by an Aho-Corasick
+automaton, however many terms it holds.
+"""
+import os
+import re
+
+from metrics import METRICS
+
+# Keyed by Guardrails entity name
+PATTERNS = {
+    "AWS_ACCESS_KEY": r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b",
+    "AWS_SECRET_KEY": r"(?i:aws_?secret_?access_?key)[\"']?\s*[:=]\s*[\"']?[A-Za-z0-9/+=]{40}\b",
+    "API_KEY": r"\b(?:sk-[A-Za-z0-9_-]{20,100}|gh[pousr]_[A-Za-z0-9]{36,100}|xox[abprs]-[A-Za-z0-9-]{10,100})\b",
+    "EMAIL": r"\b[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,40}(?:\.[A-Za-z0-9-]{1,40}){0,3}\.[A-Za-z]{2,24}\b",
+    "CREDIT_DEBIT_CARD_NUMBER": r"\b\d(?:[ -]?\d){12,18}\b",
+    "US_SOCIAL_SECURITY_NUMBER": r"\b\d{3}-\d{2}-\d{4}\b",
+    "PHONE": r"(?<![\w+])(?:\+1[ .-]?)?(?:\(\d{3}\)|\d{3})[ .-]\d{3}[ .-]\d{4}\b",
+}
+
+# Tried before the others where a token starts with a digit; cards before phones
+DIGIT_LED = ("CREDIT_DEBIT_CARD_NUMBER", "US_SOCIAL_SECURITY_NUMBER", "PHONE")
+
+# Matches are only attempted where a token starts, which skips most positions cheaply
+TOKEN_START = r"(?<![\w.%+-])"
+
+DENYLIST_ENTITY = "DENIED_TERM"
+
+# Words a match can run across: the groups of a card or phone number, and
+# the key name and "=" before an AWS secret key
+NUMBER_WORD = re.compile(r"[\d()+.-]+")
+KEY_WORD = re.compile(r"(?i:aws_?secret_?access_?key)[\"']?[:=]?|[:=][\"']?")
+WORD = re.compile(r"\S+")
+
+
+def compile_patterns(names):
+    """Compile the chosen entities into one alternation, scanned in a single pass"""
+    group = "(?P<{0}>{1})".format
+    digits = "|".join(group(n, PATTERNS[n]) for n in DIGIT_LED if n in names)
+    words = "|".join(group(n, PATTERNS[n]) for n in names if n not in DIGIT_LED)
+    branches = ([rf"(?=[\d(+])(?:{digits})"] if digits else []) + ([words] if words else [])
+    return re.compile(TOKEN_START + "(?:" + "|".join(branches) + ")") if branches else None
+
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        n = int(ch)
+        if i % 2:
+            n = n * 2 - 9 if n > 4 else n * 2
+        total += n
+    return total % 10 == 0
+
+
+class AhoCorasick:
+    """Case-insensitive multi-term matcher that reports whole-word hits in one pass"""
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [0]
+        for term in terms:
+            term = term.strip().lower()
+            if not term:
+                continue
+            node = 0
+            for ch in term:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(0)
+                node = nxt
+            self.output[node] = max(self.output[node], len(term))
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                # Longest term ending here, including those reached by the failure link
+                self.output[nxt] = max(self.output[nxt], self.output[self.fail[nxt]])
+
+    def __bool__(self):
+        return len(self.goto) > 1
+
+    def finditer(self, text, pos=0):
+        """Yield (start, end) of the longest term ending at each position"""
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        lowered = text.lower()
+        for i in range(pos, len(lowered)):
+            ch = lowered[i]
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            length = output[node]
+            if length:
+                start, end = i + 1 - length, i + 1
+                if not (start > 0 and lowered[start - 1].isalnum()) and not (end < len(lowered) and lowered[end].isalnum()):
+                    yield start, end
+
+
+class Redactor:
+    """Mask sensitive entities and deny-listed terms in prompts and responses"""
+
+    def __init__(self, entities=None, denylist=()):
+        names = list(PATTERNS) if entities is None else [e for e in PATTERNS if e in entities]
+        self.pattern = compile_patterns(names)
+        self.terms = AhoCorasick(denylist)
+        self.term_words = max((len(t.split()) for t in denylist), default=1)
+
+    def spans(self, text, pos=0):
+        """Sorted, non-overlapping (start, end, entity) matches at or after pos"""
+        found = []
+        if self.pattern is not None:
+            for m in self.pattern.finditer(text, pos):
+                if m.lastgroup == "CREDIT_DEBIT_CARD_NUMBER" and not luhn_valid(re.sub(r"\D", "", m.group())):
+                    continue
+                found.append((m.start(), m.end(), m.lastgroup))
+        if self.terms:
+            found.extend((start, end, DENYLIST_ENTITY) for start, end in self.terms.finditer(text, pos))
+            found.sort()
+        merged = []
+        for span in found:
+            if merged and span[0] < merged[-1][1]:
+                if span[1] > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], span[1], merged[-1][2])
+                continue
+            merged.append(span)
+        return merged
+
+    def _mask(self, text, spans, start=0, end=None):
+        end = len(text) if end is None else end
+        parts = []
+        for s, e, entity in spans:
+            parts.append(text[start:s])
+            parts.append("{%s}" % entity)
+            METRICS.incr("redactions_total")
+            start = e
+        parts.append(text[start:end])
+        return "".join(parts)
+
+    def redact(self, text: str) -> str:
+        if not text:
+            return text
+        spans = self.spans(text)
+        return self._mask(text, spans) if spans else text
+
+    def _tail_start(self, text):
+        """Where the words that a later chunk could still turn into a match begin"""
+        words = [(m.start(), m.group()) for m in WORD.finditer(text)]
+        if not words:
+            return 0
+        # The last word may be incomplete; earlier ones matter only if a match can run across them
+        j = len(words) - 1
+        while j > 0:
+            previous, current = words[j - 1][1], words[j][1]
+            if not (KEY_WORD.fullmatch(previous)
+                    or (NUMBER_WORD.fullmatch(previous) and NUMBER_WORD.fullmatch(current))):
+                break
+            j -= 1
+        j = max(0, min(j, len(words) - self.term_words))
+        return words[j][0]
+
+    def stream(self, chunks):
+        """Redact an iterable of text chunks, holding back only what a match could still span"""
+        pending = ""
+        for chunk in chunks:
+            pending += chunk
+            # Cut before a word so the next scan starts with the same left context
+            cutoff = self._tail_start(pending)
+            if not cutoff:
+                continue
+            spans = self.spans(pending)
+            # Never cut through a match: stop before one that reaches the held-back tail
+            for s, e, _ in spans:
+                if s < cutoff < e:
+                    cutoff = s
+                    break
+            if cutoff:
+                yield self._mask(pending, [span for span in spans if span[1] <= cutoff], 0, cutoff)
+                pending = pending[cutoff:]
+        if pending:
+            yield self.redact(pending)
+
+
+def load_denylist(path=None):
+    """Deny-listed terms, one per line, from REDACT_DENYLIST"""
+    path = path or os.environ.get("REDACT_DENYLIST")
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def redactor_from_env():
+    """Redactor configured by REDACT_ENTITIES and REDACT_DENYLIST, or None when REDACTION=0"""
+    if os.environ.get("REDACTION", "1") == "0":
+        return None
+    entities = os.environ.get("REDACT_ENTITIES")
+    return Redactor(
+        entities=[e.strip() for e in entities.split(",")] if entities else None,
+        denylist=load_denylist(),
+    )
+
+
+# Applied to every question and answer in this process
+REDACTOR = redactor_from_env()
+
+
+def redact(text: str) -> str:
+    return REDACTOR.redact(text) if REDACTOR is not None else text
+
+
+def redact_stream(chunks):
+    return REDACTOR.stream(chunks) if REDACTOR is not None else chunks
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+from clients import MODEL_ID
+from memory import estimate_tokens
+from ratelimit import THROTTLE_CODES, TRANSIENT_CODES, error_code
+
+FAILOVER_CODES = THROTTLE_CODES | TRANSIENT_CODES | {"ConnectionError", "AccessDeniedException",
+                                                     "ResourceNotFoundException"}
+
+
+class Endpoint:
+    """One (region, model) target with moving-average latency and error rate.
+
+    Blocking calls return after the whole generation while streaming calls
+    return once the headers arrive, so the two latencies are kept apart.
+    """
+
+    def __init__(self, region, model_id, small=False, alpha=0.2):
+        self.region = region
+        self.model_id = model_id
+        self.small = small
+        self.alpha = alpha
+        self.latency = None
+        self.stream_latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def __repr__(self):
+        return f"Endpoint({self.region!r}, {self.model_id!r}, small={self.small})"
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+    def latency_for(self, streaming=False):
+        return self.stream_latency if streaming else self.latency
+
+    def record_success(self, latency, streaming=False):
+        average = self.latency_for(streaming)
+        average = latency if average is None else self.alpha * latency + (1 - self.alpha) * average
+        if streaming:
+            self.stream_latency = average
+        else:
+            self.latency = average
+        self.error_rate *= 1 - self.alpha
+        self.consecutive_failures = 0
+
+    def record_failure(self, cooldown):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= 3 or self.error_rate > 0.5:
+            self.unhealthy_until = time.monotonic() + cooldown
+
+
+class Router:
+    """Send each request to the fastest healthy endpoint and fail over on errors.
+
+    Endpoints with no latency sample yet are tried first so every endpoint
+    gets measured. When ``short_prompt_tokens`` is set, prompts at or under
+    that estimate prefer endpoints marked ``small``.
+    """
+
+    def __init__(self, endpoints, short_prompt_tokens=None, cooldown=30.0):
+        self.endpoints = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("Router needs at least one endpoint")
+        self.short_prompt_tokens = short_prompt_tokens
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def candidates(self, prompt="", streaming=False):
+        """Endpoints in the order they should be tried for this prompt"""
+        now = time.monotonic()
+        prefer_small = (self.short_prompt_tokens is not None
+                        and estimate_tokens(prompt) <= self.short_prompt_tokens)
+        with self._lock:
+            return sorted(self.endpoints, key=lambda e: (
+                not e.healthy(now),
+                prefer_small != e.small,
+                -1.0 if e.latency_for(streaming) is None else e.latency_for(streaming),
+            ))
+
+    def invoke(self, fn, prompt="", streaming=False):
+        """Call fn(endpoint) on the best endpoint, failing over to the next on errors.
+
+        Set ``streaming`` when fn returns as soon as a response stream opens.
+        """
+        error = None
+        for endpoint in self.candidates(prompt, streaming):
+            started = time.perf_counter()
+            try:
+                result = fn(endpoint)
+            except Exception as e:
+                if error_code(e) not in FAILOVER_CODES:
+                    raise
+                with self._lock:
+                    endpoint.record_failure(self.cooldown)
+                error = e
+                continue
+            with self._lock:
+                endpoint.record_success(time.perf_counter() - started, streaming)
+            return result
+        raise error
+
+
+def parse_endpoints(spec):
+    """Parse ``region:model[:small],...`` into endpoints (an empty region means the default)"""
+    endpoints = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        region, _, model_id = item.partition(":")
+        small = model_id.endswith(":small")
+        if small:
+            model_id = model_id[:-len(":small")]
+        endpoints.append(Endpoint(region or None, model_id, small=small))
+    return endpoints
+
+
+def router_from_env():
+    spec = os.environ.get("BEDROCK_ENDPOINTS")
+    endpoints = parse_endpoints(spec) if spec else [Endpoint(None, MODEL_ID)]
+    short = os.environ.get("SHORT_PROMPT_TOKENS")
+    return Router(endpoints, short_prompt_tokens=int(short) if short else None)
+
+
+# Shared by every session in the process so latency estimates accumulate
+ROUTER = router_from_env()
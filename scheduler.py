@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+# Priority classes, highest first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITIES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# Lane for callers that do not identify a session
+DEFAULT_SESSION = "-"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a request would exceed the scheduler's queue-depth limits"""
+
+
+class Ticket:
+    def __init__(self, session, cost, priority):
+        self.session = session
+        self.cost = cost
+        self.priority = priority
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+
+class _FairQueue:
+    """Deficit round robin over the sessions waiting in one priority class.
+
+    Each session has its own FIFO. On its turn a session earns ``quantum``
+    tokens of credit and is served while its credit covers the estimated cost
+    of its next request, so sessions get equal token throughput no matter how
+    many requests each has queued.
+    """
+
+    def __init__(self, quantum):
+        self.quantum = quantum
+        self.queues = OrderedDict()
+        self.deficit = {}
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def push(self, ticket):
+        if ticket.session not in self.queues:
+            self.queues[ticket.session] = []
+            self.deficit[ticket.session] = 0
+        self.queues[ticket.session].append(ticket)
+
+    def pop(self):
+        while self.queues:
+            session, queue = next(iter(self.queues.items()))
+            ticket = queue[0]
+            if self.deficit[session] >= ticket.cost:
+                self.deficit[session] -= ticket.cost
+                queue.pop(0)
+                if not queue:
+                    del self.queues[session]
+                    del self.deficit[session]
+                return ticket
+            self.deficit[session] += self.quantum
+            self.queues.move_to_end(session)
+        return None
+
+    def remove(self, ticket):
+        queue = self.queues.get(ticket.session)
+        if queue is None or ticket not in queue:
+            return False
+        queue.remove(ticket)
+        if not queue:
+            del self.queues[ticket.session]
+            del self.deficit[ticket.session]
+        return True
+
+    def ahead_of(self, ticket):
+        """Roughly how many queued requests will be served before ticket"""
+        index = self.queues[ticket.session].index(ticket)
+        # One request per session per round, at equal costs; sessions earlier
+        # in the round also go first in the ticket's own round
+        ahead, before = index, True
+        for session, queue in self.queues.items():
+            if session == ticket.session:
+                before = False
+            else:
+                ahead += min(len(queue), index + 1 if before else index)
+        return ahead
+
+
+class Scheduler:
+    """Admission control for upstream generations, shared by every session in the process.
+
+    At most ``max_concurrency`` generations run at once. The rest wait in one
+    fair queue per priority class; a higher class is always dispatched first.
+    ``max_queue`` bounds the total backlog and ``max_per_session`` the
+    interactive backlog of any one session; requests beyond either raise
+    QueueFullError. Batch and background callers bound their own concurrency.
+    """
+
+    def __init__(self, max_concurrency=16, max_queue=128, max_per_session=4, quantum=1024):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_session = max_per_session
+        self.running = 0
+        self._classes = {p: _FairQueue(quantum) for p in PRIORITIES}
+        self._waiting = {}
+        self._cond = threading.Condition()
+
+    def submit(self, session, cost, priority=INTERACTIVE):
+        """Queue a request and return its ticket; it may already be granted"""
+        ticket = Ticket(session, cost, priority)
+        with self._cond:
+            if sum(len(c) for c in self._classes.values()) >= self.max_queue:
+                METRICS.incr("queue_rejected_total")
+                raise QueueFullError("The service is busy, please retry shortly")
+            lane = (session, priority)
+            if priority == INTERACTIVE and self._waiting.get(lane, 0) >= self.max_per_session:
+                METRICS.incr("queue_rejected_total")
+                raise QueueFullError("You already have requests waiting, please wait for them to finish")
+            self._waiting[lane] = self._waiting.get(lane, 0) + 1
+            self._classes[priority].push(ticket)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        while self.running < self.max_concurrency:
+            ticket = next((t for t in (self._classes[p].pop() for p in PRIORITIES) if t is not None), None)
+            if ticket is None:
+                return
+            self._left_queue(ticket)
+            ticket.granted = True
+            self.running += 1
+            METRICS.observe("queue_wait_seconds", time.monotonic() - ticket.enqueued)
+            self._cond.notify_all()
+
+    def _left_queue(self, ticket):
+        lane = (ticket.session, ticket.priority)
+        count = self._waiting[lane] - 1
+        if count:
+            self._waiting[lane] = count
+        else:
+            del self._waiting[lane]
+
+    def position(self, ticket):
+        """1-based estimate of the ticket's place in line, or 0 once it is running"""
+        with self._cond:
+            if ticket.granted:
+                return 0
+            ahead = sum(len(self._classes[p]) for p in PRIORITIES if p < ticket.priority)
+            return ahead + self._classes[ticket.priority].ahead_of(ticket) + 1
+
+    def release(self, ticket):
+        """Give back a granted slot, or withdraw a ticket that is still queued"""
+        with self._cond:
+            if ticket.granted:
+                ticket.granted = False
+                self.running -= 1
+            elif self._classes[ticket.priority].remove(ticket):
+                self._left_queue(ticket)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session, cost, priority=INTERACTIVE, on_wait=None, poll=0.5):
+        """Hold a generation slot for the body of the with-block.
+
+        While queued, on_wait(position) is called from the waiting thread each
+        time the position changes, and on_wait(0) once the slot is granted.
+        """
+        ticket = self.submit(session or DEFAULT_SESSION, cost, priority)
+        try:
+            last = 0
+            while True:
+                position = self.position(ticket)
+                if not position:
+                    break
+                if on_wait is not None and position != last:
+                    on_wait(position)
+                    last = position
+                with self._cond:
+                    if not ticket.granted:
+                        self._cond.wait(poll)
+            if on_wait is not None and last:
+                on_wait(0)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+# Every upstream generation in this process passes through here
+SCHEDULER = Scheduler(
+    max_concurrency=int(os.environ.get("SCHEDULER_MAX_CONCURRENCY", "16")),
+    max_queue=int(os.environ.get("SCHEDULER_MAX_QUEUE", "128")),
+    max_per_session=int(os.environ.get("SCHEDULER_MAX_PER_SESSION", "4")),
+    quantum=int(os.environ.get("SCHEDULER_QUANTUM", "1024")),
+)
@@ -0,0 +1,105 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.finished = False
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent identical requests into one upstream call.
+
+    While a call for a key is running, later callers with the same key wait
+    for it and share its result instead of starting their own. Streams are
+    pumped by a background thread into a shared buffer so every subscriber,
+    including the first, replays the same chunks at its own pace.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.stats = {"upstream_calls": 0, "shared_calls": 0}
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time and return its result to every caller"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["upstream_calls"] += 1
+            else:
+                self.stats["shared_calls"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key, fn, on_idle=None, poll=0.1):
+        """Iterate the chunks of fn() shared with any in-flight stream for key.
+
+        While waiting for the next chunk, on_idle() is called from the
+        subscriber's thread every ``poll`` seconds.
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = self._streams[key] = _Stream()
+                self.stats["upstream_calls"] += 1
+                threading.Thread(target=self._pump, args=(key, flight, fn), daemon=True).start()
+            else:
+                self.stats["shared_calls"] += 1
+        index = 0
+        while True:
+            with flight.cond:
+                if index >= len(flight.chunks) and not flight.finished:
+                    flight.cond.wait(None if on_idle is None else poll)
+                pending = flight.chunks[index:]
+                finished = flight.finished
+            if not pending and not finished:
+                if on_idle is not None:
+                    on_idle()
+                continue
+            index += len(pending)
+            yield from pending
+            if finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def _pump(self, key, flight, fn):
+        try:
+            for chunk in fn():
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
@@ -0,0 +1,267 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "md": ("text/markdown", "md"),
+}
+
+
+# Most query words used in a search; the rest are ignored
+MAX_SEARCH_TERMS = 16
+
+# BM25 ranks at most this many matches, the most recent ones
+MAX_SEARCH_CANDIDATES = 1000
+
+# Words in more messages than this share (or MAX_SEARCH_CANDIDATES) are too common to rank by
+COMMON_TERM_FRACTION = 0.05
+
+# Words as FTS5's unicode61 tokenizer splits them: letters and digits, case-folded
+TERM = re.compile(r"[^\W_]+")
+
+
+def format_timestamp(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+
+
+def index_terms(text: str):
+    """Distinct words of a message, as the search index sees them"""
+    return set(TERM.findall(text.lower()))
+
+
+def search_terms(query: str):
+    """Distinct words of a search query, in order"""
+    return list(dict.fromkeys(TERM.findall(query.lower())))[:MAX_SEARCH_TERMS]
+
+
+def snippet(text: str, terms, width=120) -> str:
+    """The part of text around the first query word, on one line"""
+    text = " ".join(text.split())
+    found = re.search(r"\b(?:%s)" % "|".join(map(re.escape, terms)), text, re.I) if terms else None
+    start = max(0, found.start() - width // 3) if found else 0
+    if start:
+        # Begin at a whole word
+        start = text.find(" ", start, found.start()) + 1 or start
+    clip = text[start:start + width]
+    return ("…" if start else "") + clip + ("…" if start + width < len(text) else "")
+
+
+class ConversationStore:
+    """Persistent conversation log in SQLite, shared by every session and worker.
+
+    Each conversation belongs to the owner key it was started under, and
+    is only listed and resumed for that key.
+
+    Messages are stored with a per-conversation sequence number, so appends
+    are a single indexed insert and any page of a conversation is a range
+    read on the primary key. Every message is also added to a contentless
+    FTS5 index, and its words' document counts to term_docs, in the same
+    transaction: search is ranked by BM25 and an append costs only the new
+    message's tokens.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(messages_fts)")}
+            if columns and "owner" not in columns:
+                # Built before searches were scoped to owners; the index is derived, so rebuild it
+                self._db.executescript("""
+                    DROP TABLE messages_fts; DROP TABLE IF EXISTS message_search; DROP TABLE IF EXISTS term_docs;
+                """)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY, title TEXT, created REAL, updated REAL,
+                    message_count INTEGER NOT NULL DEFAULT 0, owner TEXT
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    conversation_id TEXT, seq INTEGER, role TEXT, content TEXT, ts REAL,
+                    PRIMARY KEY (conversation_id, seq)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated);
+                CREATE TABLE IF NOT EXISTS message_search (
+                    docid INTEGER PRIMARY KEY, conversation_id TEXT, seq INTEGER
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    conversation, owner, content, content='', tokenize='unicode61 remove_diacritics 0'
+                );
+                CREATE TABLE IF NOT EXISTS term_docs (term TEXT PRIMARY KEY, docs INTEGER) WITHOUT ROWID;
+            """)
+            # Conversations stored before owners existed stay unlisted
+            if "owner" not in {row[1] for row in self._db.execute("PRAGMA table_info(conversations)")}:
+                self._db.execute("ALTER TABLE conversations ADD COLUMN owner TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS conversations_owner ON conversations (owner, updated)")
+            # The conversation and owner columns only scope a search; rank by the content alone
+            self._db.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('rank', 'bm25(0.0, 0.0, 1.0)')")
+            self._index_existing()
+            self._db.commit()
+
+    def _index_existing(self):
+        """Index messages stored before search existed; a no-op once done"""
+        if self._db.execute("SELECT 1 FROM message_search LIMIT 1").fetchone():
+            return
+        self._db.execute(
+            "INSERT INTO message_search (conversation_id, seq) SELECT conversation_id, seq FROM messages"
+        )
+        self._db.execute(
+            "INSERT INTO messages_fts (rowid, conversation, owner, content) "
+            "SELECT s.docid, m.conversation_id, c.owner, m.content FROM message_search s "
+            "JOIN messages m ON m.conversation_id = s.conversation_id AND m.seq = s.seq "
+            "JOIN conversations c ON c.id = m.conversation_id"
+        )
+        docs = Counter()
+        for (content,) in self._db.execute("SELECT content FROM messages"):
+            docs.update(index_terms(content))
+        self._db.executemany("INSERT INTO term_docs VALUES (?, ?)", docs.items())
+
+    @staticmethod
+    def new_conversation_id() -> str:
+        return uuid.uuid4().hex
+
+    def append(self, conversation_id, role, content, ts=None, owner=None) -> int:
+        """Append a message and return its sequence number; owner applies to a new conversation"""
+        ts = time.time() if ts is None else ts
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO conversations (id, title, created, updated, owner) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, " ".join(content.split())[:60] if role == "user" else "", ts, ts, owner),
+            )
+            seq, owner = self._db.execute(
+                "SELECT message_count, owner FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?)", (conversation_id, seq, role, content, ts)
+            )
+            docid = self._db.execute(
+                "INSERT INTO message_search (conversation_id, seq) VALUES (?, ?)", (conversation_id, seq)
+            ).lastrowid
+            self._db.execute(
+                "INSERT INTO messages_fts (rowid, conversation, owner, content) VALUES (?, ?, ?, ?)",
+                (docid, conversation_id, owner, content),
+            )
+            self._db.executemany(
+                "INSERT INTO term_docs VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET docs = docs + 1",
+                ((term,) for term in index_terms(content)),
+            )
+            self._db.execute(
+                "UPDATE conversations SET message_count = ?, updated = ? WHERE id = ?",
+                (seq + 1, ts, conversation_id),
+            )
+        return seq
+
+    def read(self, conversation_id, offset=0, limit=100):
+        """Return one page of messages in the session_state message format"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, ts FROM messages WHERE conversation_id = ? AND seq >= ? "
+                "ORDER BY seq LIMIT ?", (conversation_id, offset, limit)
+            ).fetchall()
+        return [
+            {"role": role, "content": content, "timestamp": format_timestamp(ts), "ts": ts}
+            for role, content, ts in rows
+        ]
+
+    def iter_messages(self, conversation_id, page_size=500):
+        """Yield every message of a conversation, one page in memory at a time"""
+        offset = 0
+        while True:
+            page = self.read(conversation_id, offset, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def list_conversations(self, owner, limit=20):
+        """The owner's most recently updated conversations as (id, title, updated, message_count)"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, title, updated, message_count FROM conversations WHERE owner = ? "
+                "ORDER BY updated DESC LIMIT ?", (owner, limit)
+            ).fetchall()
+
+    def owns(self, conversation_id, owner) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM conversations WHERE id = ? AND owner = ?", (conversation_id, owner)
+            ).fetchone() is not None
+
+    def search(self, query, owner, conversation_id=None, limit=10):
+        """Best BM25 matches for the query's words, in one of the owner's conversations or all of them.
+
+        Returns dicts in the session_state message format plus
+        ``conversation_id``, ``seq`` and the conversation ``title``.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            selective, common = self._split_terms(terms)
+            rows = self._match(selective, owner, conversation_id, limit, ranked=True) if selective else []
+            # Too common to rank by; they only add the most recent matches when results run short
+            if common and len(rows) < limit:
+                seen = {(row[0], row[1]) for row in rows}
+                recent = self._match(selective + common, owner, conversation_id, limit + len(rows), ranked=False)
+                rows += [row for row in recent if (row[0], row[1]) not in seen][:limit - len(rows)]
+        return [
+            {"conversation_id": cid, "seq": seq, "role": role, "content": content,
+             "timestamp": format_timestamp(ts), "ts": ts, "title": title}
+            for cid, seq, role, content, ts, title in rows
+        ]
+
+    def _split_terms(self, terms):
+        """Indexed query words, split into (selective, common) by how many messages hold them.
+
+        FTS5's bm25() counts every matching message of each word first, so
+        ranking by a word found in most messages costs a scan of all of them.
+        """
+        docs = dict(self._db.execute(
+            "SELECT term, docs FROM term_docs WHERE term IN (%s)" % ",".join("?" * len(terms)), terms
+        ).fetchall())
+        (total,) = self._db.execute("SELECT max(docid) FROM message_search").fetchone()
+        threshold = max(MAX_SEARCH_CANDIDATES, (total or 0) * COMMON_TERM_FRACTION)
+        found = [term for term in terms if term in docs]
+        return [t for t in found if docs[t] <= threshold], [t for t in found if docs[t] > threshold]
+
+    def _match(self, terms, owner, conversation_id, limit, ranked):
+        # Quoted, so query words are never read as FTS5 operators
+        match = "content : (%s)" % " OR ".join('"%s"' % term for term in terms)
+        if conversation_id is not None:
+            match = 'conversation : "%s" AND %s' % (conversation_id.replace('"', '""'), match)
+        match = 'owner : "%s" AND %s' % (owner.replace('"', '""'), match)
+        if ranked:
+            # Rank the most recent candidates, then fetch only the best ones
+            hits = ("SELECT rowid, rank FROM (SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ? "
+                    "ORDER BY rowid DESC LIMIT %d) ORDER BY rank LIMIT ?" % MAX_SEARCH_CANDIDATES)
+        else:
+            hits = "SELECT rowid, -rowid AS rank FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+        return self._db.execute(
+            "SELECT m.conversation_id, m.seq, m.role, m.content, m.ts, c.title FROM (%s) f "
+            "JOIN message_search s ON s.docid = f.rowid "
+            "JOIN messages m ON m.conversation_id = s.conversation_id AND m.seq = s.seq "
+            "JOIN conversations c ON c.id = m.conversation_id ORDER BY f.rank" % hits,
+            (match, limit),
+        ).fetchall()
+
+    def iter_export(self, conversation_id, fmt="txt"):
+        """Yield a conversation export in txt, jsonl or md, one message at a time"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == "md":
+            yield "# Conversation\n\n"
+        for msg in self.iter_messages(conversation_id):
+            role = "You" if msg["role"] == "user" else "Llama 3"
+            if fmt == "txt":
+                yield f"{role} ({msg['timestamp']}):\n{msg['content']}\n\n"
+            elif fmt == "jsonl":
+                yield json.dumps({"role": msg["role"], "content": msg["content"], "ts": msg["ts"]}) + "\n"
+            else:
+                yield f"### {role} ({msg['timestamp']})\n\n{msg['content']}\n\n"
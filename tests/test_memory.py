@@ -0,0 +1,55 @@
+import threading
+import time
+
+from memory import Message, SessionRegistry
+
+
+def history(n=3):
+    return [Message("user", f"question {i}") for i in range(n)], [f"<p>{i}</p>" for i in range(n)]
+
+
+def test_idle_session_is_evicted():
+    registry = SessionRegistry(idle_seconds=0.0, sweep_interval=0.0)
+    messages, fragments = history()
+    registry.touch("a", messages, fragments)
+    time.sleep(0.01)
+    registry.touch("b", *history())
+    assert messages == [] and fragments == []
+    assert registry.take_evicted("a")
+    assert not registry.take_evicted("a")
+
+
+def test_running_session_is_not_evicted():
+    registry = SessionRegistry(idle_seconds=0.0, sweep_interval=0.0)
+    messages, fragments = history()
+    with registry.running("a"):
+        registry.touch("a", messages, fragments)
+        time.sleep(0.01)
+        registry.touch("b", *history())
+        assert len(messages) == 3 and len(fragments) == 3
+        assert not registry.take_evicted("a")
+    time.sleep(0.01)
+    registry.touch("b", *history())
+    assert messages == []
+    assert registry.take_evicted("a")
+
+
+def test_running_session_is_skipped_over_budget():
+    registry = SessionRegistry(budget=1, min_idle_seconds=0.0, sweep_interval=3600.0)
+    busy, _ = history()
+    idle, _ = history()
+    done = threading.Event()
+
+    def run():
+        with registry.running("busy"):
+            registry.touch("busy", busy, [])
+            done.wait(1.0)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.05)
+    registry.touch("idle", idle, [])
+    assert len(busy) == 3 and idle == []
+    assert registry.stats["evicted_sessions"] == 1
+    done.set()
+    thread.join()
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip("botocore")
+
+from botocore.exceptions import ClientError, ConnectionClosedError, ReadTimeoutError
+
+from ratelimit import TRANSIENT_CODES, BedrockGuard, error_code
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+def guard():
+    return BedrockGuard(requests_per_minute=6000, tokens_per_minute=1_000_000, max_attempts=3, base_delay=0.0)
+
+
+def failing(*errors, result="answer"):
+    """fn() that raises each error in turn and then returns result"""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return fn, calls
+
+
+@pytest.mark.parametrize("exc", [
+    ReadTimeoutError(endpoint_url="https://bedrock-runtime"),
+    ConnectionClosedError(endpoint_url="https://bedrock-runtime"),
+])
+def test_read_timeouts_and_dropped_connections_are_transient(exc):
+    assert error_code(exc) in TRANSIENT_CODES
+
+
+def test_error_code_looks_through_re_raised_errors():
+    try:
+        try:
+            raise ReadTimeoutError(endpoint_url="https://bedrock-runtime")
+        except ReadTimeoutError as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as e:
+        assert error_code(e) in TRANSIENT_CODES
+
+
+def test_read_timeout_is_retried():
+    fn, calls = failing(ReadTimeoutError(endpoint_url="https://bedrock-runtime"))
+    assert guard().call(fn) == "answer"
+    assert len(calls) == 2
+
+
+def test_read_timeout_on_every_attempt_counts_as_a_breaker_failure():
+    limiter = guard()
+    fn, calls = failing(*(ReadTimeoutError(endpoint_url="https://bedrock-runtime") for _ in range(3)))
+    with pytest.raises(ReadTimeoutError):
+        limiter.call(fn)
+    assert len(calls) == 3
+    assert limiter.breaker.failures == 1
+
+
+def test_throttles_are_retried_but_never_open_the_breaker():
+    limiter = guard()
+    fn, calls = failing(*(client_error("ThrottlingException") for _ in range(3)))
+    with pytest.raises(ClientError):
+        limiter.call(fn)
+    assert len(calls) == 3
+    assert limiter.breaker.failures == 0
+
+
+def test_validation_errors_are_not_retried():
+    limiter = guard()
+    fn, calls = failing(client_error("ValidationException"))
+    with pytest.raises(ClientError):
+        limiter.call(fn)
+    assert len(calls) == 1
+    assert limiter.breaker.failures == 0
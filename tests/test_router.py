@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+pytest.importorskip("botocore")
+
+from botocore.exceptions import ClientError
+
+from router import Endpoint, Router, parse_endpoints
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+class StubBedrock:
+    """Local endpoints with configurable latency and errors, keyed by region"""
+
+    def __init__(self, latency=None, errors=None):
+        self.latency = latency or {}
+        self.errors = errors or {}
+        self.calls = []
+
+    def __call__(self, endpoint):
+        self.calls.append(endpoint.region)
+        time.sleep(self.latency.get(endpoint.region, 0.0))
+        error = self.errors.get(endpoint.region)
+        if error is not None:
+            raise error
+        return endpoint.region
+
+
+def regions(endpoints):
+    return [endpoint.region for endpoint in endpoints]
+
+
+def test_every_endpoint_is_measured_then_the_fastest_wins():
+    router = Router([Endpoint("slow", "m"), Endpoint("fast", "m")])
+    bedrock = StubBedrock(latency={"slow": 0.03, "fast": 0.0})
+    for _ in range(4):
+        router.invoke(bedrock)
+    assert bedrock.calls == ["slow", "fast", "fast", "fast"]
+    assert regions(router.candidates()) == ["fast", "slow"]
+
+
+def test_throttled_endpoint_fails_over_to_the_next():
+    router = Router([Endpoint("a", "m"), Endpoint("b", "m")])
+    bedrock = StubBedrock(errors={"a": client_error("ThrottlingException")})
+    assert router.invoke(bedrock) == "b"
+    assert bedrock.calls == ["a", "b"]
+
+
+def test_other_errors_are_raised_without_failover():
+    router = Router([Endpoint("a", "m"), Endpoint("b", "m")])
+    bedrock = StubBedrock(errors={"a": client_error("ValidationException")})
+    with pytest.raises(ClientError):
+        router.invoke(bedrock)
+    assert bedrock.calls == ["a"]
+
+
+def test_the_last_error_is_raised_when_every_endpoint_fails():
+    router = Router([Endpoint("a", "m"), Endpoint("b", "m")])
+    bedrock = StubBedrock(errors={region: client_error("ServiceUnavailableException") for region in "ab"})
+    with pytest.raises(ClientError):
+        router.invoke(bedrock)
+    assert bedrock.calls == ["a", "b"]
+
+
+def test_failing_endpoint_cools_down_and_then_comes_back():
+    router = Router([Endpoint("a", "m"), Endpoint("b", "m")], cooldown=0.05)
+    failing = StubBedrock(errors={"a": client_error("InternalServerException")})
+    for _ in range(3):
+        router.invoke(failing)
+    assert regions(router.candidates()) == ["b", "a"]
+    time.sleep(0.06)
+    # Healthy again, and unmeasured endpoints are tried before measured ones
+    assert regions(router.candidates()) == ["a", "b"]
+
+
+def test_short_prompts_prefer_small_models():
+    router = Router([Endpoint("big", "m"), Endpoint("small", "s", small=True)], short_prompt_tokens=10)
+    assert regions(router.candidates("Hi")) == ["small", "big"]
+    assert regions(router.candidates("x" * 400)) == ["big", "small"]
+
+
+def test_stream_and_blocking_latencies_are_kept_apart():
+    router = Router([Endpoint("a", "m"), Endpoint("b", "m")])
+    # a opens streams fastest while b finishes blocking calls fastest
+    for streaming, latency in ((True, {"a": 0.0, "b": 0.02}), (False, {"a": 0.04, "b": 0.0})):
+        bedrock = StubBedrock(latency=latency)
+        router.invoke(bedrock, streaming=streaming)
+        router.invoke(bedrock, streaming=streaming)
+    assert regions(router.candidates(streaming=True)) == ["a", "b"]
+    assert regions(router.candidates()) == ["b", "a"]
+
+
+def test_parse_endpoints():
+    endpoints = parse_endpoints("us-east-1:big, us-west-2:tiny:small, :default")
+    assert [(e.region, e.model_id, e.small) for e in endpoints] == [
+        ("us-east-1", "big", False), ("us-west-2", "tiny", True), (None, "default", False)]
+
+
+def test_router_needs_an_endpoint():
+    with pytest.raises(ValueError):
+        Router([])
+    with pytest.raises(ValueError):
+        Router(parse_endpoints(","))
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from scheduler import BACKGROUND, BATCH, INTERACTIVE, QueueFullError, Scheduler
+
+
+def busy_scheduler(**kwargs):
+    """Scheduler with one slot, already taken, so every later request queues"""
+    scheduler = Scheduler(max_concurrency=1, **kwargs)
+    return scheduler, scheduler.submit("holder", 1)
+
+
+def grant_order(scheduler, running, tickets):
+    """Release the running ticket repeatedly and return the names granted, in order"""
+    names = {id(ticket): name for name, ticket in tickets}
+    order = []
+    for _ in tickets:
+        scheduler.release(running)
+        running = next(ticket for _, ticket in tickets if ticket.granted)
+        order.append(names[id(running)])
+    return order
+
+
+def test_sessions_take_turns_however_many_requests_each_queued():
+    scheduler, running = busy_scheduler(quantum=100)
+    tickets = [("a", scheduler.submit("a", 100, BATCH)) for _ in range(4)]
+    tickets += [("b", scheduler.submit("b", 100, BATCH)) for _ in range(2)]
+    assert grant_order(scheduler, running, tickets) == ["a", "b", "a", "b", "a", "a"]
+
+
+def test_turns_are_weighted_by_request_cost():
+    scheduler, running = busy_scheduler(quantum=100)
+    tickets = [("cheap", scheduler.submit("cheap", 100, BATCH)) for _ in range(4)]
+    tickets += [("costly", scheduler.submit("costly", 200, BATCH)) for _ in range(2)]
+    assert grant_order(scheduler, running, tickets) == ["cheap", "cheap", "costly", "cheap", "cheap", "costly"]
+
+
+def test_higher_priority_classes_are_served_first():
+    scheduler, running = busy_scheduler()
+    tickets = [
+        ("background", scheduler.submit("s", 1, BACKGROUND)),
+        ("batch", scheduler.submit("s", 1, BATCH)),
+        ("interactive", scheduler.submit("s", 1, INTERACTIVE)),
+    ]
+    assert grant_order(scheduler, running, tickets) == ["interactive", "batch", "background"]
+
+
+def test_one_session_cannot_queue_more_than_its_share():
+    scheduler, _ = busy_scheduler(max_per_session=2)
+    waiting = scheduler.submit("a", 1)
+    scheduler.submit("a", 1)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("a", 1)
+    # Other sessions and lower classes are unaffected
+    scheduler.submit("b", 1)
+    scheduler.submit("a", 1, BATCH)
+    # Withdrawing a waiting request frees its place
+    scheduler.release(waiting)
+    scheduler.submit("a", 1)
+
+
+def test_total_backlog_is_bounded():
+    scheduler, _ = busy_scheduler(max_queue=2)
+    scheduler.submit("a", 1, BATCH)
+    scheduler.submit("b", 1, BATCH)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("c", 1, BATCH)
+
+
+def test_position():
+    scheduler, running = busy_scheduler(quantum=1)
+    first = scheduler.submit("a", 1)
+    second = scheduler.submit("a", 1)
+    other = scheduler.submit("b", 1)
+    background = scheduler.submit("c", 1, BACKGROUND)
+    assert scheduler.position(running) == 0
+    assert scheduler.position(first) == 1
+    # b gets its turn before a's second request
+    assert scheduler.position(other) == 2
+    assert scheduler.position(second) == 3
+    assert scheduler.position(background) == 4
+    scheduler.release(running)
+    assert scheduler.position(first) == 0
+    assert scheduler.position(background) == 3
+
+
+def test_slot_reports_queue_positions_until_granted():
+    scheduler, running = busy_scheduler()
+    positions = []
+    granted = threading.Event()
+
+    def wait_for_slot():
+        with scheduler.slot("a", 1, on_wait=positions.append, poll=0.01):
+            granted.set()
+
+    thread = threading.Thread(target=wait_for_slot)
+    thread.start()
+    assert not granted.wait(0.1)
+    scheduler.release(running)
+    thread.join(1)
+    assert granted.is_set()
+    assert positions == [1, 0]
+    assert scheduler.running == 0
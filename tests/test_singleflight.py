@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+CALLERS = 8
+
+
+def run_concurrently(target, count=CALLERS):
+    """Call target() from count threads at once and collect results or raised errors"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+class Upstream:
+    """Slow fake upstream that counts its calls"""
+
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+    def call(self):
+        self._enter()
+        return "answer"
+
+    def stream(self):
+        self._enter()
+        for word in ("one ", "two ", "three"):
+            time.sleep(0.01)
+            yield word
+
+
+def test_do_makes_one_upstream_call_for_identical_callers():
+    flight, upstream = SingleFlight(), Upstream()
+    results = run_concurrently(lambda: flight.do("key", upstream.call))
+    assert results == ["answer"] * CALLERS
+    assert upstream.calls == 1
+    assert flight.stats == {"upstream_calls": 1, "shared_calls": CALLERS - 1}
+
+
+def test_do_propagates_the_error_to_every_caller():
+    flight, upstream = SingleFlight(), Upstream(error=ValueError("boom"))
+    results = run_concurrently(lambda: flight.do("key", upstream.call))
+    assert upstream.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_do_calls_again_once_the_first_call_is_done():
+    flight, upstream = SingleFlight(), Upstream(delay=0)
+    assert flight.do("key", upstream.call) == "answer"
+    assert flight.do("key", upstream.call) == "answer"
+    assert upstream.calls == 2
+
+
+def test_do_keeps_different_keys_apart():
+    flight, upstream = SingleFlight(), Upstream()
+    results = run_concurrently(lambda: flight.do(threading.get_ident(), upstream.call))
+    assert results == ["answer"] * CALLERS
+    assert upstream.calls == CALLERS
+
+
+def test_stream_makes_one_upstream_call_for_identical_callers():
+    flight, upstream = SingleFlight(), Upstream()
+    results = run_concurrently(lambda: "".join(flight.stream("key", upstream.stream)))
+    assert results == ["one two three"] * CALLERS
+    assert upstream.calls == 1
+
+
+def test_stream_propagates_the_error_to_every_subscriber():
+    flight, upstream = SingleFlight(), Upstream(error=ValueError("boom"))
+    results = run_concurrently(lambda: list(flight.stream("key", upstream.stream)))
+    assert upstream.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_stream_error_after_chunks_reaches_the_subscriber():
+    def fail_midway():
+        yield "partial"
+        raise ValueError("boom")
+
+    chunks = SingleFlight().stream("key", fail_midway)
+    assert next(chunks) == "partial"
+    with pytest.raises(ValueError):
+        next(chunks)
+
+
+def test_stream_calls_on_idle_while_waiting():
+    idle = []
+
+    def slow():
+        time.sleep(0.3)
+        yield "done"
+
+    assert list(SingleFlight().stream("key", slow, on_idle=lambda: idle.append(1), poll=0.05)) == ["done"]
+    assert idle
@@ -0,0 +1,88 @@
+import io
+import json
+import time
+
+import pytest
+
+pytest.importorskip("botocore")
+
+import inference
+from cache import ResponseCache
+from singleflight import SingleFlight
+
+WORDS = ["Streaming ", "sends ", "each ", "chunk ", "as ", "it ", "is ", "generated."]
+CHUNK_DELAY = 0.03
+
+
+def chunk(payload):
+    return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+
+class FakeBedrock:
+    """bedrock-runtime stand-in that generates one word every CHUNK_DELAY seconds"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def events(self):
+        for word in WORDS:
+            time.sleep(CHUNK_DELAY)
+            yield chunk({"generation": word})
+        # Events without a chunk and the closing metrics must be skipped
+        yield {"internalServerException": None}
+        yield chunk({"generation": "", "amazon-bedrock-invocationMetrics": {
+            "inputTokenCount": 12, "outputTokenCount": len(WORDS)}})
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.calls += 1
+        return {"body": self.events()}
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        time.sleep(CHUNK_DELAY * len(WORDS))
+        return {"body": io.BytesIO(json.dumps({"generation": "".join(WORDS)}).encode("utf-8"))}
+
+
+@pytest.fixture
+def bedrock(monkeypatch):
+    client = FakeBedrock()
+    monkeypatch.setattr(inference, "get_bedrock_client", lambda region_name=None: client)
+    monkeypatch.setattr(inference, "BEDROCK_DIRECT", True)
+    monkeypatch.setattr(inference, "RESPONSE_CACHE", ResponseCache())
+    monkeypatch.setattr(inference, "IN_FLIGHT", SingleFlight())
+    return client
+
+
+def test_stream_generation_yields_only_generated_text(bedrock):
+    assert list(inference.stream_generation("prompt")) == WORDS
+    assert bedrock.calls == 1
+
+
+def test_stream_answer_matches_the_blocking_answer(bedrock):
+    streamed = "".join(inference.ask_llama3_stream("What is streaming?"))
+    inference.RESPONSE_CACHE.clear()
+    assert inference.ask_llama3("What is streaming?") == streamed == "".join(WORDS)
+
+
+def test_stream_fills_the_cache(bedrock):
+    first = "".join(inference.ask_llama3_stream("What is caching?"))
+    assert list(inference.ask_llama3_stream("What is caching?")) == [first]
+    assert bedrock.calls == 1
+
+
+def test_time_to_first_token_beats_the_blocking_path(bedrock, record_property):
+    started = time.perf_counter()
+    chunks = inference.ask_llama3_stream("How fast is the first token?")
+    next(chunks)
+    first_token = time.perf_counter() - started
+    list(chunks)
+
+    inference.RESPONSE_CACHE.clear()
+    started = time.perf_counter()
+    inference.ask_llama3("How fast is the first token?")
+    blocking = time.perf_counter() - started
+
+    record_property("stream_time_to_first_token", round(first_token, 4))
+    record_property("blocking_latency", round(blocking, 4))
+    # The first chunk needs one word of generation; the blocking call waits for all of them
+    assert first_token < blocking / 2
@@ -0,0 +1,151 @@
+"""HTML fragments for the Streamlit app.
+
+Streamlit re-executes app.py on every rerun, but imported modules persist,
+so the templates here are compiled once per process. Every value substituted
+into a template is HTML-escaped unless it is already Markup. The stylesheet
+lives in theme/app.css and is linked into the page once per browser session
+by a zero-height component, so reruns do not resend it.
+"""
+import hashlib
+import os
+import re
+from html import escape
+from pathlib import Path
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+THEME_DIR = Path(__file__).resolve().parent / "theme"
+STYLESHEET = (THEME_DIR / "app.css").read_text(encoding="utf-8")
+
+# Versioned so a changed stylesheet is never served from the browser cache
+STYLESHEET_HREF = f"app.css?v={hashlib.sha1(STYLESHEET.encode('utf-8')).hexdigest()[:10]}"
+
+# Resend the stylesheet inline on every rerun, for hosts that block the component
+INLINE_CSS = os.environ.get("UI_INLINE_CSS", "0") == "1"
+
+_theme = components.declare_component("theme", path=str(THEME_DIR))
+
+BROWSER_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).strip()
+
+
+class Markup(str):
+    """Trusted HTML that templates insert without escaping"""
+
+
+class Template:
+    """HTML fragment prepared once; rendering only escapes the values and formats"""
+
+    def __init__(self, source: str):
+        # One line, so markdown never mistakes indented HTML for a code block
+        self.source = " ".join(line.strip() for line in source.strip().splitlines())
+
+    def __call__(self, **values) -> Markup:
+        return Markup(self.source.format_map(
+            {k: v if isinstance(v, Markup) else escape(str(v)) for k, v in values.items()}
+        ))
+
+
+def text_block(text: str) -> Markup:
+    """Escape free text and keep its line breaks inside an HTML block"""
+    return Markup(escape(text).replace("\n", "<br>"))
+
+
+def inject_theme():
+    """Link the stylesheet into the page and return the browser's id, or None until it reports"""
+    if INLINE_CSS:
+        st.markdown(_INLINE_STYLE, unsafe_allow_html=True)
+    browser_id = _theme(href=None if INLINE_CSS else STYLESHEET_HREF, identify=True, key="theme", default=None)
+    # Client-supplied, so only accept what the component generates
+    return browser_id if isinstance(browser_id, str) and BROWSER_ID.fullmatch(browser_id) else None
+
+
+def scroll_to(element_id: str):
+    """Scroll the page to an element and highlight it, once the element is painted"""
+    _theme(href=STYLESHEET_HREF, scroll_to=element_id, key="scroll", default=None)
+
+
+def render(*fragments):
+    """Send several fragments in a single markdown element"""
+    st.markdown("".join(fragments), unsafe_allow_html=True)
+
+
+_INLINE_STYLE = f"<style>{minify_css(STYLESHEET)}</style>"
+
+HEADER = Template("""
+<div class="header-slide">
+    <h1 class="animated-title">🚀 Ask Anything: Chat with Llama 3 (AWS Bedrock) 🌟</h1>
+    <div class="header-icons">
+        <div class="floating">🤖</div><div class="pulse">⚡</div><div class="floating">🧠</div>
+    </div>
+</div>
+""")
+
+PANEL_TITLE = Template("""
+<div class="glass-panel {animation}"><{tag}>{title}</{tag}></div>
+""")
+
+METRICS = Template("""
+<div class="metric-grid">
+    <div class="metric-container slide-in-left">
+        <h3>💬 Messages</h3><h2 class="metric-messages">{messages}</h2>
+    </div>
+    <div class="metric-container slide-in-right">
+        <h3>🔄 Conversations</h3><h2 class="metric-conversations">{conversations}</h2>
+    </div>
+</div>
+""")
+
+STATS_CARD = Template("""
+<div class="stats-card"><h4>{title}</h4>{rows}</div>
+""")
+
+STATS_ROW = Template("<p>{text}</p>")
+
+CHAT_TITLE = Template("""
+<div class="chat-container"><h2>💬 Conversation History</h2></div>
+""")
+
+MESSAGE = Template("""
+<div class="message message-appear message-{role}" id="{anchor}">
+    <h4>{author} ({timestamp})</h4>
+    <p>{content}</p>
+</div>
+""")
+
+MESSAGE_SEPARATOR = Markup('<hr class="message-separator">')
+
+WELCOME = Template("""
+<div class="welcome-card welcome-bounce">
+    <h2>👋 Welcome to the AI Chat Experience!</h2>
+    <p>Start a conversation by asking a question above. I'm here to help with anything you need! 🚀</p>
+    <div class="sparkles">🌟 ✨ 💫</div>
+</div>
+""")
+
+
+def stats_card(title: str, *rows: str) -> Markup:
+    return STATS_CARD(title=title, rows=Markup("".join(STATS_ROW(text=row) for row in rows)))
+
+
+def message_anchor(seq: int) -> str:
+    """Element id of the message at this position in its conversation"""
+    return f"message-{seq}"
+
+
+def message_html(message, seq) -> Markup:
+    """HTML fragment for one chat message"""
+    user = message["role"] == "user"
+    return MESSAGE(
+        role="user" if user else "assistant",
+        anchor=message_anchor(seq),
+        author="👤 You" if user else "🤖 Llama 3",
+        timestamp=message["timestamp"],
+        content=text_block(message["content"]),
+    )